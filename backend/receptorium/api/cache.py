@@ -0,0 +1,139 @@
+from hashlib import md5
+from time import monotonic
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Version
+
+FAVORITES_VERSION_KEY = 'favorites_version'
+INGREDIENTS_VERSION_KEY = 'ingredients_version'
+RECIPES_VERSION_KEY = 'recipes_version'
+REFERENCE_VERSION_KEY = 'reference_version'
+SEARCH_VERSION_KEY = 'search_version'
+TAGS_VERSION_KEY = 'tags_version'
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+ORDERING_PARAM = 'ordering'
+_local_versions = {}
+
+
+def get_versions(*keys):
+    """Возвращает текущие версии данных, общие для всех процессов,
+    одним запросом. Версия, которую ещё не меняли, пустая"""
+    versions = dict(Version.objects.filter(
+        key__in=keys
+    ).values_list('key', 'value'))
+    return [versions.get(key, '') for key in keys]
+
+
+def get_version(key):
+    """Возвращает текущую версию данных, общую для всех процессов"""
+    return get_versions(key)[0]
+
+
+def get_local_version(key):
+    """Возвращает версию, которую этот процесс читал не раньше
+    VERSION_CHECK_INTERVAL секунд назад. Частые запросы к справочникам
+    так не обращаются к хранилищу версий, а изменения из других
+    процессов становятся видны не позже чем через интервал"""
+    version, checked_at = _local_versions.get(key, (None, None))
+    now = monotonic()
+    if checked_at is None or (
+        now - checked_at >= settings.VERSION_CHECK_INTERVAL
+    ):
+        version = get_version(key)
+        _local_versions[key] = (version, now)
+    return version
+
+
+def forget_local_versions():
+    _local_versions.clear()
+
+
+def bump_version(key):
+    """Меняет версию данных, чтобы процессы пересобрали
+    свои копии. Свой процесс видит новую версию сразу"""
+    value = uuid4().hex
+    if not Version.objects.filter(key=key).update(
+        value=value, updated_at=timezone.now()
+    ):
+        Version.objects.bulk_create(
+            [Version(key=key, value=value)], ignore_conflicts=True
+        )
+    _local_versions.pop(key, None)
+
+
+def delete_versions(*keys):
+    """Удаляет версии удалённых объектов"""
+    Version.objects.filter(key__in=keys).delete()
+    for key in keys:
+        _local_versions.pop(key, None)
+
+
+def get_recipe_version_key(pk):
+    return f'recipe_version_{pk}'
+
+
+def get_user_version_key(pk):
+    return f'user_version_{pk}'
+
+
+def get_user_version(user):
+    """Возвращает версию избранного, списка покупок
+    и подписок пользователя"""
+    if not user.is_authenticated:
+        return None
+    return get_version(get_user_version_key(user.pk))
+
+
+def get_response_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def get_request_digest(request):
+    """Возвращает хэш адреса запроса с отсортированными параметрами"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()
+    ).hexdigest()
+
+
+def is_ordered_by_counters(request):
+    """Сортировка по счётчику избранного меняется при каждом
+    добавлении в избранное, а версия и updated_at рецепта нет"""
+    return bool(request.query_params.get(ORDERING_PARAM))
+
+
+def get_recipe_list_cache_key(request):
+    """Возвращает ключ кэша для списка рецептов или None,
+    если выдача зависит от пользователя"""
+    if any(request.query_params.get(name) for name in USER_FILTERS):
+        return None
+    keys = [RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY]
+    if is_ordered_by_counters(request):
+        keys.append(FAVORITES_VERSION_KEY)
+    return 'recipes_list_{}_{}'.format(
+        '_'.join(get_versions(*keys)), get_request_digest(request)
+    )
+
+
+def get_recipe_cache_key(request, pk):
+    """Возвращает ключ кэша для рецепта"""
+    return 'recipe_{}_{}_{}_{}'.format(
+        pk,
+        *get_versions(get_recipe_version_key(pk), REFERENCE_VERSION_KEY),
+        get_request_digest(request)
+    )
+
+
+def get_cached_validators(key, compute):
+    """Возвращает ETag и Last-Modified, сохранённые под версионным
+    ключом ответа, чтобы повторные запросы не обращались к базе"""
+    if key is None:
+        return compute()
+    return get_response_cache().get_or_set(
+        f'{key}_validators', compute, settings.RECIPE_CACHE_TIMEOUT
+    )
@@ -0,0 +1,45 @@
+import csv
+import json
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку"""
+    def write(self, value):
+        return value
+
+
+def export_txt(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name} - {amount} {measurement_unit}\r\n'
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_json(rows):
+    separator = ''
+    yield '['
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+SHOPPING_CART_EXPORTERS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'json': (export_json, 'application/json; charset=utf-8'),
+}
@@ -1,11 +1,24 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Recipe
+from recipes.models import Favorite, Recipe, ShoppingList, Tag
+from recipes.search import full_text_search, is_full_text_supported
+from .indexes import recipe_search_index
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """Сортирует рецепты, сохраняя порядок по убыванию id
+    для рецептов с одинаковым значением"""
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            qs = qs.order_by(*qs.query.order_by, '-pk')
+        return qs
 
 
 class RecipeFilter(filters.FilterSet):
     """Фильтрует рецепты по избранному, списку покупок,
-    и тэгам"""
+    тэгам и поисковому запросу, сортирует по популярности"""
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited',
         method='favorite_filter'
@@ -14,15 +27,45 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_in_shopping_cart',
         method='shopping_cart_filter'
     )
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+        method='tags_filter'
+    )
+    search = filters.CharFilter(method='search_filter')
+    ordering = RecipeOrderingFilter(fields=('favorites_count',))
 
     def favorite_filter(self, queryset, name, value):
-        recipes = Recipe.objects.filter(favorites__user=self.request.user)
-        return recipes
+        return self.user_list_filter(queryset, Favorite, value)
 
     def shopping_cart_filter(self, queryset, name, value):
-        recipes = Recipe.objects.filter(shopping_lists__user=self.request.user)
-        return recipes
+        return self.user_list_filter(queryset, ShoppingList, value)
+
+    def user_list_filter(self, queryset, model, value):
+        """Оставляет рецепты из списка пользователя или,
+        если value ложно, исключает их"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        in_list = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        )
+        return queryset.filter(in_list if value else ~in_list)
+
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value
+            )
+        ))
+
+    def search_filter(self, queryset, name, value):
+        if is_full_text_supported():
+            return full_text_search(queryset, value)
+        return recipe_search_index.filter(queryset, value)
 
     class Meta:
         model = Recipe
@@ -1,31 +1,196 @@
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
-from recipes.models import Recipe
-from .serializers import RecipeForFavoriteSubscriptionsSerializer
+from recipes.feed import follows_added
+from recipes.models import (Favorite, Follow, Recipe, RecipeIngredient,
+                            ShoppingList)
+from recipes.utils import (increment_counters, lock_users,
+                           refresh_shopping_cart_totals)
+from user.models import User
+from .cache import FAVORITES_VERSION_KEY, get_user_version_key
+from .serializers import (BulkAuthorsSerializer, BulkRecipesSerializer,
+                          RecipeForFavoriteSubscriptionsSerializer,
+                          SubscriptionsSerializer)
+from .signals import bump_on_commit
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingList: 'shopping_count',
+}
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции, чтобы
+    пакетные операции одного пользователя не пересекались"""
+    lock_users([user.pk])
+
+
+def create_unique(model, **fields):
+    """Создаёт строку и возвращает False, если такая уже есть.
+    Прочие ошибки целостности, в том числе из обработчиков
+    сигналов, пробрасываются дальше"""
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return False
+        raise
+    return True
+
+
+def error_response(message):
+    return Response(
+        data={"errors": message}, status=status.HTTP_400_BAD_REQUEST
+    )
 
 
 def object_add_or_delete(model, request, pk):
     """Функция для создания или удаления объекта из модели"""
-    recipe = get_object_or_404(Recipe, pk=pk)
     if request.method == 'POST':
-        _, created = model.objects.get_or_create(
-            user=request.user, recipe=recipe
-        )
-        if not created:
-            return Response(
-                data={"errors": "Рецепт уже добавлен в список"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        recipe = get_object_or_404(Recipe, pk=pk)
+        if not create_unique(model, user=request.user, recipe=recipe):
+            return error_response("Рецепт уже добавлен в список")
         serializer = RecipeForFavoriteSubscriptionsSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    if not model.objects.filter(
-        user=request.user, recipe=recipe
-    ).exists():
-        return Response(
-                data={"errors": "Рецепт отсутствует в списке"},
-                status=status.HTTP_400_BAD_REQUEST
+    deleted, _ = model.objects.filter(user=request.user, recipe=pk).delete()
+    if not deleted:
+        if not Recipe.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return error_response("Рецепт отсутствует в списке")
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def objects_bulk_add_or_delete(model, request):
+    """Функция для добавления или удаления нескольких рецептов
+    из списка за один запрос"""
+    serializer = BulkRecipesSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = serializer.validated_data['recipes']
+    found = set(Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('pk', flat=True))
+    with transaction.atomic():
+        lock_user(request.user)
+        current = set(model.objects.filter(
+            user=request.user, recipe__in=found
+        ).values_list('recipe', flat=True))
+        if request.method == 'POST':
+            changed = [pk for pk in recipe_ids if pk in found - current]
+            model.objects.bulk_create(
+                (model(user=request.user, recipe_id=pk) for pk in changed),
+                ignore_conflicts=True
             )
-    model.objects.get(user=request.user, recipe=recipe).delete()
+            # bulk_create не отправляет сигналы, версию, счётчики
+            # и суммы списка покупок обновляем вручную
+            bump_on_commit(get_user_version_key(request.user.pk))
+            if changed and model is Favorite:
+                bump_on_commit(FAVORITES_VERSION_KEY)
+            if changed:
+                increment_counters(Recipe, changed, RECIPE_COUNTERS[model])
+            if changed and model is ShoppingList:
+                refresh_shopping_cart_totals(
+                    [request.user.pk],
+                    RecipeIngredient.objects.filter(
+                        recipe__in=changed
+                    ).values('ingredient')
+                )
+            done, error = 'added', "Рецепт уже добавлен в список"
+        else:
+            changed = [pk for pk in recipe_ids if pk in current]
+            model.objects.filter(
+                user=request.user, recipe__in=changed
+            ).delete()
+            done, error = 'removed', "Рецепт отсутствует в списке"
+    changed = set(changed)
+    results = []
+    for pk in recipe_ids:
+        if pk in changed:
+            results.append({'id': pk, 'status': done})
+        else:
+            results.append({
+                'id': pk,
+                'status': 'error',
+                'errors': error if pk in found else "Рецепт не найден"
+            })
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+def subscribe_or_unsubscribe(request, pk):
+    """Функция для подписки на автора или отписки от него"""
+    if str(request.user.pk) == str(pk):
+        return Response(
+            data={"error": "Нельзя подписываться на самого себя"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if request.method == 'POST':
+        following_user = get_object_or_404(User, pk=pk)
+        if not create_unique(
+            Follow, user=request.user, author=following_user
+        ):
+            return error_response("Автор уже добавлен в список")
+        serializer = SubscriptionsSerializer(
+            following_user, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    deleted, _ = Follow.objects.filter(
+        user=request.user, author=pk
+    ).delete()
+    if not deleted:
+        if not User.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return error_response("Автор отсутствует в списке")
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def bulk_subscribe_or_unsubscribe(request):
+    """Функция для подписки на нескольких авторов или отписки
+    от них за один запрос"""
+    serializer = BulkAuthorsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    author_ids = serializer.validated_data['authors']
+    found = set(User.objects.filter(
+        pk__in=author_ids
+    ).exclude(pk=request.user.pk).values_list('pk', flat=True))
+    with transaction.atomic():
+        lock_user(request.user)
+        current = set(Follow.objects.filter(
+            user=request.user, author__in=found
+        ).values_list('author', flat=True))
+        if request.method == 'POST':
+            changed = [pk for pk in author_ids if pk in found - current]
+            Follow.objects.bulk_create(
+                (Follow(user=request.user, author_id=pk) for pk in changed),
+                ignore_conflicts=True
+            )
+            if changed:
+                follows_added(request.user.pk, changed)
+            bump_on_commit(get_user_version_key(request.user.pk))
+            done, error = 'added', "Автор уже добавлен в список"
+        else:
+            changed = [pk for pk in author_ids if pk in current]
+            Follow.objects.filter(
+                user=request.user, author__in=changed
+            ).delete()
+            done, error = 'removed', "Автор отсутствует в списке"
+    changed = set(changed)
+    results = []
+    for pk in author_ids:
+        if pk in changed:
+            results.append({'id': pk, 'status': done})
+        elif pk == request.user.pk:
+            results.append({
+                'id': pk,
+                'status': 'error',
+                'errors': "Нельзя подписываться на самого себя"
+            })
+        else:
+            results.append({
+                'id': pk,
+                'status': 'error',
+                'errors': error if pk in found else "Автор не найден"
+            })
+    return Response({'results': results}, status=status.HTTP_200_OK)
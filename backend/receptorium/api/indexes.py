@@ -0,0 +1,338 @@
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from hashlib import md5
+
+from django.conf import settings
+from django.db.models import Case, FloatField, Max, Value, When
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.similarity import FORMAT_VERSION, HEADER, MAGIC
+from .cache import (INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY,
+                    SEARCH_VERSION_KEY, TAGS_VERSION_KEY, get_local_version,
+                    get_version)
+
+NAME_WEIGHT = 3
+RECIPE_INDEX_LAG = timedelta(minutes=1)
+
+
+class IngredientIndex:
+    """Префиксный индекс названий ингредиентов в памяти процесса.
+    Собирается при первом обращении и пересобирается,
+    когда меняется версия ингредиентов. Версия перечитывается
+    не чаще VERSION_CHECK_INTERVAL, поэтому повторный поиск
+    не обращается к базе"""
+    def __init__(self):
+        self.version = None
+        self.updated_at = None
+        self.keys = []
+        self.items = []
+
+    def build(self):
+        items = []
+        updated_at = None
+        for pk, name, unit, changed in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit', 'updated_at'
+        ):
+            items.append({'id': pk, 'name': name, 'measurement_unit': unit})
+            if updated_at is None or changed > updated_at:
+                updated_at = changed
+        items.sort(key=lambda item: (item['name'].lower(), item['id']))
+        self.keys, self.items, self.updated_at = [
+            item['name'].lower() for item in items
+        ], items, updated_at
+
+    def refresh(self):
+        version = get_local_version(INGREDIENTS_VERSION_KEY)
+        if version != self.version:
+            self.build()
+            self.version = version
+
+    def all(self):
+        self.refresh()
+        return self.items
+
+    def search(self, query, limit):
+        """Возвращает сначала точные совпадения, затем
+        совпадения по началу названия, затем по вхождению.
+        Версию проверяет refresh, его вызывают один раз за запрос
+        до валидаторов ответа"""
+        keys, items = self.keys, self.items
+        query = query.strip().lower()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        exact = [items[i] for i in range(start, end) if keys[i] == query]
+        prefix = [items[i] for i in range(start, end) if keys[i] != query]
+        result = (exact + prefix)[:limit]
+        for i, key in enumerate(keys):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(items[i])
+        return result
+
+
+class ReferenceSnapshot:
+    """Справочник, заранее сериализованный в JSON, в памяти процесса.
+    Пересобирается, когда меняется версия под version_key,
+    версия перечитывается не чаще VERSION_CHECK_INTERVAL.
+    build возвращает список объектов и дату последнего изменения"""
+    def __init__(self, version_key, build):
+        self.version_key = version_key
+        self.build = build
+        self.version = None
+        self.snapshot = (b'', None, None)
+
+    def refresh(self):
+        version = get_local_version(self.version_key)
+        if version != self.version:
+            items, updated_at = self.build()
+            content = JSONRenderer().render(items)
+            self.snapshot = (content, md5(content).hexdigest(), updated_at)
+            self.version = version
+
+    def get(self):
+        """Возвращает JSON, его хэш и дату последнего изменения"""
+        self.refresh()
+        return self.snapshot
+
+
+def build_tags():
+    items = []
+    updated_at = None
+    for pk, name, color, slug, changed in Tag.objects.values_list(
+        'id', 'name', 'color', 'slug', 'updated_at'
+    ):
+        items.append({'id': pk, 'name': name, 'color': color, 'slug': slug})
+        if updated_at is None or changed > updated_at:
+            updated_at = changed
+    return items, updated_at
+
+
+def build_ingredients():
+    return ingredient_index.all(), ingredient_index.updated_at
+
+
+def tokenize(text):
+    """Разбивает текст на слова в нижнем регистре"""
+    return re.findall(r'\w+', text.lower())
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс поисковых документов рецептов
+    в памяти процесса для баз без полнотекстового поиска.
+    Пересобирается, когда меняется версия поисковых документов"""
+    def __init__(self):
+        self.version = None
+        self.terms = []
+        self.postings = {}
+
+    def build(self):
+        postings = defaultdict(lambda: defaultdict(int))
+        for pk, name, document in Recipe.objects.values_list(
+            'pk', 'name', 'search_document'
+        ):
+            for term in tokenize(document):
+                postings[term][pk] += 1
+            for term in tokenize(name):
+                postings[term][pk] += NAME_WEIGHT
+        self.terms = sorted(postings)
+        self.postings = {
+            term: dict(recipes) for term, recipes in postings.items()
+        }
+
+    def refresh(self):
+        version = get_version(SEARCH_VERSION_KEY)
+        if version != self.version:
+            self.build()
+            self.version = version
+
+    def search(self, query):
+        """Возвращает словарь id рецептов и их веса для рецептов,
+        в которых каждое слово запроса встречается как начало слова"""
+        self.refresh()
+        ranks = None
+        for token in set(tokenize(query)):
+            start = bisect_left(self.terms, token)
+            end = bisect_left(self.terms, token + '\uffff', start)
+            token_ranks = defaultdict(int)
+            for term in self.terms[start:end]:
+                for pk, weight in self.postings[term].items():
+                    token_ranks[pk] += weight
+            if ranks is None:
+                ranks = token_ranks
+            else:
+                ranks = {
+                    pk: rank + token_ranks[pk]
+                    for pk, rank in ranks.items() if pk in token_ranks
+                }
+            if not ranks:
+                break
+        return dict(ranks or {})
+
+    def filter(self, queryset, query):
+        """Оставляет найденные рецепты и сортирует их по весу"""
+        groups = defaultdict(list)
+        for pk, rank in self.search(query).items():
+            groups[rank].append(pk)
+        if not groups:
+            return queryset.none()
+        return queryset.filter(
+            pk__in=[pk for pks in groups.values() for pk in pks]
+        ).annotate(search_rank=Case(
+            *(When(pk__in=pks, then=Value(rank))
+              for rank, pks in groups.items()),
+            default=Value(0),
+            output_field=FloatField()
+        )).order_by('-search_rank', '-pk')
+
+
+def build_bitsets(pairs):
+    """Собирает битовые множества ингредиентов рецептов
+    из пар (id рецепта, id ингредиента)"""
+    bitsets = defaultdict(int)
+    for recipe_id, ingredient_id in pairs:
+        bitsets[recipe_id] |= 1 << ingredient_id
+    return bitsets
+
+
+class RecipeIngredientSetIndex:
+    """Ингредиенты каждого рецепта в виде битового множества,
+    где номер бита равен id ингредиента. При изменении версии рецептов
+    перечитываются только рецепты, изменённые с прошлой сборки:
+    правка строки ингредиента обновляет updated_at рецепта
+    в обработчике сигнала, а массовые записи сохраняют рецепт сами"""
+    def __init__(self):
+        self.version = None
+        self.updated_at = None
+        self.bitsets = {}
+        self.size = 0
+
+    def load(self, recipes):
+        bitsets = build_bitsets(RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).values_list('recipe', 'ingredient').iterator())
+        for recipe_id in recipes.values_list('pk', flat=True):
+            bits = bitsets.get(recipe_id, 0)
+            self.bitsets[recipe_id] = bits
+            self.size = max(self.size, bits.bit_length())
+        updated_at = recipes.aggregate(
+            updated_at=Max('updated_at')
+        )['updated_at']
+        if updated_at is not None and (
+            self.updated_at is None or updated_at > self.updated_at
+        ):
+            self.updated_at = updated_at
+
+    def refresh(self):
+        version = get_version(RECIPES_VERSION_KEY)
+        if version == self.version:
+            return
+        if self.updated_at is None:
+            self.bitsets = {}
+            self.size = 0
+            self.load(Recipe.objects.all())
+        else:
+            self.load(Recipe.objects.filter(
+                updated_at__gte=self.updated_at - RECIPE_INDEX_LAG
+            ))
+            if Recipe.objects.count() != len(self.bitsets):
+                existing = set(Recipe.objects.values_list('pk', flat=True))
+                self.bitsets = {
+                    recipe_id: bits
+                    for recipe_id, bits in self.bitsets.items()
+                    if recipe_id in existing
+                }
+        self.version = version
+
+    def match(self, ingredient_ids, max_missing):
+        """Возвращает пары (id рецепта, число недостающих ингредиентов)
+        для рецептов, где есть хотя бы один из ингредиентов и не хватает
+        не больше max_missing, сначала те, где не хватает меньше"""
+        self.refresh()
+        have = 0
+        for ingredient_id in ingredient_ids:
+            if ingredient_id < self.size:
+                have |= 1 << ingredient_id
+        lacking = ~have
+        matches = []
+        for recipe_id, bits in self.bitsets.items():
+            if not bits & have:
+                continue
+            missing = bin(bits & lacking).count('1')
+            if missing <= max_missing:
+                matches.append((recipe_id, missing))
+        matches.sort(key=lambda match: (match[1], -match[0]))
+        return matches
+
+
+class SimilarRecipesIndex:
+    """Похожие рецепты из файла, собранного командой
+    build_similar_recipes. Файл отображается в память при первом
+    обращении и открывается заново, когда его подменяют"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stamp = None
+        self.k = 0
+        self.recipe_ids = []
+        self.similar_ids = []
+        self.scores = []
+
+    def load(self, path):
+        with open(path, 'rb') as index_file:
+            data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, k, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'Неизвестный формат индекса: {path}')
+        view = memoryview(data)
+        offset = HEADER.size
+        sections = []
+        for code, size in (('Q', count), ('Q', count * k), ('f', count * k)):
+            end = offset + size * struct.calcsize(code)
+            sections.append(view[offset:end].cast(code))
+            offset = end
+        self.k = k
+        self.recipe_ids, self.similar_ids, self.scores = sections
+
+    def refresh(self):
+        path = settings.SIMILAR_RECIPES_INDEX_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.reset()
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self.stamp:
+            self.load(path)
+            self.stamp = stamp
+
+    def similar(self, recipe_id):
+        """Возвращает пары (id похожего рецепта, коэффициент сходства)"""
+        self.refresh()
+        position = bisect_left(self.recipe_ids, recipe_id)
+        if position == len(self.recipe_ids) or (
+            self.recipe_ids[position] != recipe_id
+        ):
+            return []
+        start = position * self.k
+        return [
+            (self.similar_ids[i], self.scores[i])
+            for i in range(start, start + self.k) if self.similar_ids[i]
+        ]
+
+
+ingredient_index = IngredientIndex()
+tag_snapshot = ReferenceSnapshot(TAGS_VERSION_KEY, build_tags)
+ingredient_snapshot = ReferenceSnapshot(
+    INGREDIENTS_VERSION_KEY, build_ingredients
+)
+recipe_search_index = RecipeSearchIndex()
+recipe_ingredient_set_index = RecipeIngredientSetIndex()
+similar_recipes_index = SimilarRecipesIndex()
@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .profiling import QueryProfiler, instrument_serializers
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilerMiddleware:
+    """Считает SQL-запросы, время базы и сериализации для каждого
+    запроса и ищет N+1: одну и ту же форму запроса, повторённую
+    больше QUERY_PROFILER_REPEAT_THRESHOLD раз. Итоги уходят
+    в заголовок Server-Timing и в лог. У потоковых ответов запросы
+    выполняются и при чтении тела: заголовок отправляется раньше
+    и учитывает только запросы до начала отдачи, а лог пишется
+    после отдачи и учитывает все"""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_serializers()
+
+    @contextmanager
+    def profile(self, profiler):
+        with ExitStack() as stack:
+            stack.enter_context(profiler.activate())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profiler))
+            yield
+
+    def __call__(self, request):
+        profiler = QueryProfiler()
+        started = time.perf_counter()
+        with self.profile(profiler):
+            response = self.get_response(request)
+        total_time = time.perf_counter() - started
+        response['Server-Timing'] = self.get_server_timing(
+            profiler, total_time, profiler.get_repeated(
+                settings.QUERY_PROFILER_REPEAT_THRESHOLD
+            )
+        )
+        if response.streaming:
+            response.streaming_content = self.profile_stream(
+                response.streaming_content, profiler, request, response,
+                started
+            )
+        else:
+            self.log(request, response, profiler, total_time)
+        return response
+
+    def profile_stream(self, content, profiler, request, response,
+                       started):
+        """Отдаёт тело потокового ответа, учитывая запросы, которые
+        выполняются при получении каждой части"""
+        content = iter(content)
+        while True:
+            with self.profile(profiler):
+                chunk = next(content, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.log(
+            request, response, profiler, time.perf_counter() - started
+        )
+
+    def log(self, request, response, profiler, total_time):
+        n_plus_one = profiler.get_repeated(
+            settings.QUERY_PROFILER_REPEAT_THRESHOLD
+        )
+        log = logger.warning if n_plus_one else logger.info
+        log(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profiler.count,
+            'db_ms': round(profiler.db_time * 1000, 1),
+            'serializer_ms': round(profiler.serializer_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            'repeated': [
+                {'sql': fingerprint, 'count': count}
+                for fingerprint, count in profiler.get_repeated()
+            ],
+            'n_plus_one': len(n_plus_one),
+        }, ensure_ascii=False))
+
+    def get_server_timing(self, profiler, total_time, n_plus_one):
+        metrics = [
+            f'db;dur={profiler.db_time * 1000:.1f};'
+            f'desc="{profiler.count} queries"',
+            f'serializer;dur={profiler.serializer_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ]
+        if n_plus_one:
+            metrics.append(
+                f'n-plus-one;desc="{len(n_plus_one)} repeated shapes"'
+            )
+        return ', '.join(metrics)
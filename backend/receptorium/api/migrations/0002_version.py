@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+def drop_version_cache_table(apps, schema_editor):
+    # Раньше версии хранились в DatabaseCache в этой таблице
+    tables = schema_editor.connection.introspection.table_names()
+    if 'cache_versions' in tables:
+        schema_editor.execute(
+            f'DROP TABLE {schema_editor.quote_name("cache_versions")}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_version_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('value', models.CharField(max_length=32, verbose_name='Значение')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+        migrations.RunPython(
+            drop_version_cache_table, migrations.RunPython.noop
+        ),
+    ]
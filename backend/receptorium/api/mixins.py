@@ -0,0 +1,117 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .cache import (get_recipe_cache_key, get_recipe_list_cache_key,
+                    get_response_cache)
+from .utils import overlay_user_flags
+
+
+class ConditionalGetMixin:
+    """Отдаёт ETag и Last-Modified для list и retrieve и отвечает
+    304 Not Modified, не сериализуя данные, если они не изменились.
+    Вьюсет должен определить get_list_validators
+    и get_object_validators"""
+    def get_list_validators(self, request):
+        raise NotImplementedError
+
+    def get_object_validators(self, request, pk):
+        raise NotImplementedError
+
+    def get_conditional_response(self, validators, method, request,
+                                 *args, **kwargs):
+        etag_parts, last_modified = validators
+        etag = quote_etag(md5(
+            '|'.join(str(part) for part in etag_parts).encode()
+        ).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = method(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_snapshot_response(self, request, snapshot):
+        """Отдаёт готовый JSON справочника без обращения к базе
+        и сериализаторам"""
+        content, digest, updated_at = snapshot.get()
+        return self.get_conditional_response(
+            ([digest], updated_at),
+            lambda request: HttpResponse(
+                content, content_type='application/json'
+            ),
+            request
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            self.get_list_validators(request),
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_conditional_response(
+            self.get_object_validators(request, pk),
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class RecipeCacheMixin:
+    """Отдаёт анонимную версию списка и рецепта из кэша
+    и накладывает на неё флаги текущего пользователя"""
+    anonymous_payload = False
+    cache_keys = None
+
+    def get_cache_key(self, request, pk=None):
+        """Возвращает ключ кэша списка или рецепта pk. Ключ нужен
+        и для валидаторов, и для ответа, а версии в нём читаются
+        из общего хранилища, поэтому он считается один раз за запрос"""
+        if self.cache_keys is None:
+            self.cache_keys = {}
+        if pk not in self.cache_keys:
+            self.cache_keys[pk] = (
+                get_recipe_list_cache_key(request) if pk is None
+                else get_recipe_cache_key(request, pk)
+            )
+        return self.cache_keys[pk]
+
+    def get_cached_response(self, key, method, request, *args, **kwargs):
+        response_cache = get_response_cache()
+        data = response_cache.get(key)
+        if data is None:
+            self.anonymous_payload = True
+            data = method(request, *args, **kwargs).data
+            response_cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+        if request.user.is_authenticated:
+            overlay_user_flags(data.get('results', [data]), request.user)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        return self.get_cached_response(
+            key, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            self.get_cache_key(request, str(kwargs['pk'])),
+            super().retrieve, request, *args, **kwargs
+        )
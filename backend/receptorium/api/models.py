@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class Version(models.Model):
+    """Версия кэшированных данных, общая для всех процессов.
+    Меняется одним UPDATE, версии удалённых рецептов
+    и пользователей удаляются вместе с ними"""
+    key = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Ключ'
+    )
+    value = models.CharField(max_length=32, verbose_name='Значение')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
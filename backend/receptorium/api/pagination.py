@@ -1,6 +1,102 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Постраничный вывод по курсору в порядке убывания id
+    без подсчёта общего количества объектов"""
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = '-pk'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
 
 
 class RecipePageNumberPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы или по курсору.
+    Курсор идёт по убыванию id, поэтому его нельзя сочетать
+    с другой сортировкой: ordering или релевантностью поиска"""
     page_size_query_param = 'limit'
-    page_size = 6
\ No newline at end of file
+    page_size = 6
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = RecipeCursorPagination
+    cursor_pagination = None
+    cursor_incompatible_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        for param in self.cursor_incompatible_params:
+            if request.query_params.get(param):
+                raise ValidationError({
+                    'cursor': f'Курсор нельзя сочетать с параметром {param}'
+                })
+        self.cursor_pagination = self.cursor_pagination_class()
+        return self.cursor_pagination.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipeMatchPagination(PageNumberPagination):
+    """Постраничный вывод рецептов, отсортированных в памяти"""
+    page_size_query_param = 'limit'
+    page_size = 6
+
+
+class RecipeFeedPagination(CursorPagination):
+    """Постраничный вывод ленты по курсору: курсор хранит id последнего
+    показанного рецепта, а страницу отдаёт функция get_recipe_ids"""
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = '-pk'
+
+    def paginate_feed(self, request, get_recipe_ids):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        recipe_ids = get_recipe_ids(before, self.page_size + 1)
+        self.has_next = len(recipe_ids) > self.page_size
+        recipe_ids = recipe_ids[:self.page_size]
+        if recipe_ids:
+            self.next_position = recipe_ids[-1]
+        return recipe_ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
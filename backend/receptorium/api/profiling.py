@@ -0,0 +1,89 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from rest_framework.serializers import BaseSerializer
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+_local = threading.local()
+
+
+def get_fingerprint(sql):
+    """Возвращает форму запроса: литералы и параметры заменяются
+    на ?, списки IN (...) разной длины сводятся к одному виду"""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    return LIST_RE.sub('(...)', sql)
+
+
+def get_current_profiler():
+    return getattr(_local, 'profiler', None)
+
+
+class QueryProfiler:
+    """Собирает статистику SQL-запросов одного запроса к API:
+    подключается к соединению через execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[get_fingerprint(sql)] += 1
+
+    @contextmanager
+    def activate(self):
+        previous = get_current_profiler()
+        _local.profiler = self
+        try:
+            yield self
+        finally:
+            _local.profiler = previous
+
+    def get_repeated(self, threshold=1):
+        """Возвращает формы запросов, выполненные больше threshold раз"""
+        return [
+            (fingerprint, count)
+            for fingerprint, count in self.fingerprints.most_common()
+            if count > threshold
+        ]
+
+
+def instrument_serializers():
+    """Подменяет BaseSerializer.data, чтобы профилировщик учитывал
+    время сериализации. Вложенные сериализаторы не считаются
+    повторно"""
+    original = BaseSerializer.data
+    if getattr(original.fget, 'profiled', False):
+        return
+
+    def data(self):
+        profiler = get_current_profiler()
+        if profiler is None or profiler.serializer_depth:
+            return original.fget(self)
+        profiler.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            profiler.serializer_depth -= 1
+            profiler.serializer_time += time.perf_counter() - started
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
@@ -1,13 +1,77 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
-from api.utils import double_checker, ingredient_for_recipe_create
+from api.signals import search_changed
+from api.utils import (double_checker, get_recipe_queryset, get_recipes_limit,
+                       ingredient_for_recipe_create,
+                       ingredient_for_recipe_update)
 from recipes.models import (Favorite, Follow, Ingredient, Recipe,
                             RecipeIngredient, ShoppingList, Tag)
+from recipes.images import enqueue_image_task
 from user.models import User
 
 
+class ImageSrcsetField(serializers.Field):
+    """Поле с копиями фото рецепта в формате srcset
+    для каждого формата изображения"""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        srcset = {}
+        for rendition in value.renditions.all():
+            url = rendition.image.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(rendition.format, []).append(
+                f'{url} {rendition.width}w'
+            )
+        return {
+            image_format: ', '.join(urls)
+            for image_format, urls in srcset.items()
+        }
+
+
+class RecipeImageField(Base64ImageField):
+    """Поле для фото рецепта: принимает base64-строку или файл
+    из multipart-запроса и ограничивает размер и число пикселей"""
+    default_error_messages = {
+        'max_size': 'Размер фото не должен превышать {max_size} байт',
+        'max_pixels': 'Фото не должно превышать {max_pixels} пикселей',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.check_size(data.size)
+            image = serializers.ImageField.to_internal_value(self, data)
+        else:
+            if isinstance(data, str):
+                payload = data.partition(';base64,')[2] or data
+                self.check_size(len(payload) * 3 // 4)
+            image = super().to_internal_value(data)
+        if image is not None:
+            self.check_pixels(image.image)
+        return image
+
+    def check_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('max_size', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+
+    def check_pixels(self, image):
+        width, height = image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                'max_pixels', max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+
+
 class CustomUserSerializer(UserSerializer):
     """Кастомный сериализатор для модели юзера"""
     is_subscribed = serializers.SerializerMethodField()
@@ -24,6 +88,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context['request'].user.is_authenticated:
             return Follow.objects.filter(
                 author=obj,
@@ -72,6 +138,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
@@ -84,11 +151,14 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context['request'].user.is_authenticated:
             return Favorite.objects.filter(
                 user=self.context['request'].user,
@@ -97,6 +167,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context['request'].user.is_authenticated:
             return ShoppingList.objects.filter(
                 user=self.context['request'].user,
@@ -119,7 +191,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов"""
     ingredients = IngredientForRecipeCreateSerializer(many=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -146,33 +218,56 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         double_checker([tags, ingredients])
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         ingredient_for_recipe_create(ingredients, recipe)
+        enqueue_image_task(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance.pk).delete()
-        ingredient_for_recipe_create(ingredients, instance)
-        return super().update(instance, validated_data)
+        changed_ingredients = ingredient_for_recipe_update(
+            ingredients, instance
+        )
+        if changed_ingredients:
+            search_changed(instance.pk)
+        # сохраняются только изменившиеся поля: по ним обработчики
+        # сигналов решают, пересобирать ли поиск, а фото ставится
+        # в очередь, только если прислали новое
+        changed = [
+            attr for attr, value in validated_data.items()
+            if getattr(instance, attr) != value
+        ]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+        instance.save(update_fields=[*changed, 'updated_at'])
+        if 'image' in changed:
+            enqueue_image_task(instance)
+        return instance
 
     def to_representation(self, value):
-        serializer = RecipeSerializer(value, context=self.context)
+        recipe = get_recipe_queryset(self.context['request'].user).get(
+            pk=value.pk
+        )
+        serializer = RecipeSerializer(recipe, context=self.context)
         return serializer.data
 
 
 class RecipeForFavoriteSubscriptionsSerializer(serializers.ModelSerializer):
     """Вложенный сериализатор для сериализаторов для избранного
     и подписок"""
+    image_srcset = ImageSrcsetField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class SubscriptionsSerializer(CustomUserSerializer):
@@ -194,12 +289,38 @@ class SubscriptionsSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj)
-        if limit:
-            queryset = queryset[:int(limit)]
-        return RecipeForFavoriteSubscriptionsSerializer(queryset, many=True).data
+        if hasattr(obj, 'recipes_preview'):
+            queryset = obj.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context['request'])
+            queryset = Recipe.objects.filter(author=obj)[:limit]
+        return RecipeForFavoriteSubscriptionsSerializer(
+            queryset, many=True
+        ).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
+        return obj.recipes_count
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Сериализатор для списка рецептов в пакетных операциях"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class BulkAuthorsSerializer(serializers.Serializer):
+    """Сериализатор для списка авторов в пакетных подписках"""
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_authors(self, value):
+        return list(dict.fromkeys(value))
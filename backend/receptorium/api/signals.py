@@ -0,0 +1,358 @@
+from contextlib import contextmanager
+from functools import wraps
+from threading import local
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Tag)
+from recipes.feed import fan_out_recipe, follows_added, follows_removed
+from recipes.search import update_search_documents
+from recipes.utils import (increment_counter, refresh_recipes_cart_totals,
+                           refresh_shopping_cart_totals, touch_recipes)
+from user.models import User
+from .cache import (FAVORITES_VERSION_KEY, INGREDIENTS_VERSION_KEY,
+                    RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY,
+                    SEARCH_VERSION_KEY, TAGS_VERSION_KEY, bump_version,
+                    delete_versions, get_recipe_version_key,
+                    get_user_version_key)
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+SEARCH_FIELDS = {'name', 'text'}
+
+
+class AppliedChanges(local):
+    """Версии и поисковые документы, уже обновлённые после коммита.
+    Каждое изменение регистрирует свой обработчик, чтобы откат
+    точки сохранения отбрасывал его вместе с данными, а повторы
+    внутри одного коммита пропускаются"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.versions = set()
+        self.recipe_ids = set()
+
+
+_applied = AppliedChanges()
+
+
+class DeletingRecipes(local):
+    """Пользователи и ингредиенты списков покупок с удаляемыми
+    рецептами: при каскадном удалении строки ShoppingList
+    и RecipeIngredient исчезают раньше самого рецепта"""
+
+    def __init__(self):
+        self.recipes = {}
+
+
+_deleting = DeletingRecipes()
+
+
+class MutedReceivers(local):
+    muted = False
+
+
+_muted = MutedReceivers()
+
+
+@contextmanager
+def receivers_muted():
+    """Отключает обработчики этого модуля в текущем потоке, например
+    при массовом удалении, после которого производные данные всё равно
+    пересчитываются целиком"""
+    previous, _muted.muted = _muted.muted, True
+    try:
+        yield
+    finally:
+        _muted.muted = previous
+
+
+def unless_muted(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _muted.muted:
+            handler(*args, **kwargs)
+    return wrapper
+
+
+def schedule(callback):
+    """Регистрирует обработчик коммита. Раз идёт новая запись,
+    обработчики прошлого коммита уже отработали и их учёт сбрасывается"""
+    _applied.reset()
+    transaction.on_commit(callback)
+
+
+def apply_versions(*keys):
+    """Меняет версии, которые ещё не менялись после этого коммита"""
+    for key in set(keys) - _applied.versions:
+        _applied.versions.add(key)
+        bump_version(key)
+
+
+def bump_on_commit(*keys):
+    """Меняет версии после коммита, чтобы в кэш не попали
+    незакоммиченные данные"""
+    schedule(lambda: apply_versions(*keys))
+
+
+def delete_versions_on_commit(*keys):
+    """Удаляет версии удалённого объекта после коммита, их изменения
+    в том же коммите после удаления пропускаются"""
+    def delete():
+        _applied.versions.update(keys)
+        delete_versions(*keys)
+    schedule(delete)
+
+
+def recipes_changed(*recipe_ids):
+    bump_on_commit(
+        RECIPES_VERSION_KEY,
+        *(get_recipe_version_key(pk) for pk in recipe_ids)
+    )
+
+
+def search_changed(*recipe_ids):
+    """Пересобирает поисковые документы рецептов после коммита,
+    когда ингредиенты рецепта уже записаны"""
+    def update():
+        changed = set(recipe_ids) - _applied.recipe_ids
+        if not changed:
+            return
+        _applied.recipe_ids.update(changed)
+        update_search_documents(changed)
+        apply_versions(SEARCH_VERSION_KEY, RECIPES_VERSION_KEY)
+    schedule(update)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@unless_muted
+def ingredients_changed(**kwargs):
+    bump_on_commit(
+        INGREDIENTS_VERSION_KEY, REFERENCE_VERSION_KEY, RECIPES_VERSION_KEY
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@unless_muted
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        search_changed(*instance.recipes.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@unless_muted
+def tags_changed(**kwargs):
+    bump_on_commit(
+        TAGS_VERSION_KEY, REFERENCE_VERSION_KEY, RECIPES_VERSION_KEY
+    )
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@unless_muted
+def recipe_changed(instance, **kwargs):
+    recipes_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+@unless_muted
+def recipe_version_deleted(instance, **kwargs):
+    delete_versions_on_commit(get_recipe_version_key(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+@unless_muted
+def user_version_deleted(instance, **kwargs):
+    delete_versions_on_commit(get_user_version_key(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+@unless_muted
+def recipe_created(instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+@unless_muted
+def follow_created(instance, created, **kwargs):
+    if created:
+        follows_added(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+@unless_muted
+def follow_deleted(instance, **kwargs):
+    follows_removed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Recipe)
+@unless_muted
+def recipe_text_changed(instance, update_fields, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        search_changed(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@unless_muted
+def recipe_ingredient_changed(instance, **kwargs):
+    """Строки ингредиентов меняют и в обход рецепта, например
+    в админке, а по updated_at рецепта индекс ингредиентов
+    и валидаторы ответов находят изменённые рецепты"""
+    recipe_ids = {row.recipe_id for row in get_changed_rows(instance)}
+    touch_recipes(recipe_ids - _deleting.recipes.keys())
+    recipes_changed(*recipe_ids)
+    search_changed(*recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@unless_muted
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipes_changed(instance.pk)
+    elif pk_set:
+        recipes_changed(*pk_set)
+    else:
+        bump_on_commit(RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY)
+
+
+@receiver(post_save, sender=User)
+@unless_muted
+def author_changed(instance, created, update_fields, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    recipes_changed(*instance.recipes.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingList)
+@receiver([post_save, post_delete], sender=Follow)
+@unless_muted
+def user_lists_changed(instance, **kwargs):
+    bump_on_commit(get_user_version_key(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@unless_muted
+def favorites_changed(**kwargs):
+    """Сортировка по популярности зависит от всех избранных"""
+    bump_on_commit(FAVORITES_VERSION_KEY)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingList)
+@receiver(pre_save, sender=RecipeIngredient)
+@unless_muted
+def remember_previous(sender, instance, **kwargs):
+    """Запоминает прежнюю строку, чтобы после правки в админке
+    пересчитать и старые суммы списка покупок"""
+    instance.previous = None
+    if not instance._state.adding:
+        instance.previous = sender.objects.filter(pk=instance.pk).first()
+
+
+def get_changed_rows(instance):
+    previous = getattr(instance, 'previous', None)
+    return [instance] if previous is None else [instance, previous]
+
+
+@receiver([post_save, post_delete], sender=ShoppingList)
+@unless_muted
+def shopping_list_changed(instance, **kwargs):
+    if instance.recipe_id in _deleting.recipes:
+        return
+    rows = get_changed_rows(instance)
+    refresh_shopping_cart_totals(
+        {row.user_id for row in rows},
+        RecipeIngredient.objects.filter(
+            recipe__in={row.recipe_id for row in rows}
+        ).values('ingredient')
+    )
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@unless_muted
+def recipe_ingredient_amount_changed(instance, **kwargs):
+    if instance.recipe_id in _deleting.recipes:
+        return
+    rows = get_changed_rows(instance)
+    refresh_recipes_cart_totals(
+        {row.recipe_id for row in rows},
+        {row.ingredient_id for row in rows}
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+@unless_muted
+def recipe_deleting(instance, **kwargs):
+    _deleting.recipes[instance.pk] = (
+        list(instance.shopping_lists.values_list('user', flat=True)),
+        list(instance.recipes_ingredients.values_list(
+            'ingredient', flat=True
+        ))
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@unless_muted
+def recipe_deleted(instance, **kwargs):
+    users, ingredients = _deleting.recipes.pop(instance.pk, ((), ()))
+    if users:
+        refresh_shopping_cart_totals(users, ingredients)
+
+
+@receiver(pre_save, sender=Recipe)
+@unless_muted
+def remember_previous_author(instance, update_fields, **kwargs):
+    instance.previous = None
+    if not instance._state.adding and (
+        update_fields is None or 'author' in update_fields
+    ):
+        instance.previous = Recipe.objects.filter(
+            pk=instance.pk
+        ).only('author').first()
+
+
+def update_counter(instance, created, model, pk_field, field):
+    """Меняет счётчик у связанного объекта: при создании +1,
+    при удалении -1, при переносе строки на другой объект
+    у прежнего -1 и у нового +1"""
+    pk = getattr(instance, pk_field)
+    previous = getattr(instance, 'previous', None)
+    if created is None:
+        increment_counter(model, pk, field, -1)
+    elif created:
+        increment_counter(model, pk, field)
+    elif previous is not None and getattr(previous, pk_field) != pk:
+        increment_counter(model, getattr(previous, pk_field), field, -1)
+        increment_counter(model, pk, field)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@unless_muted
+def favorite_counted(instance, created=None, **kwargs):
+    if instance.recipe_id not in _deleting.recipes:
+        update_counter(
+            instance, created, Recipe, 'recipe_id', 'favorites_count'
+        )
+
+
+@receiver([post_save, post_delete], sender=ShoppingList)
+@unless_muted
+def shopping_list_counted(instance, created=None, **kwargs):
+    if instance.recipe_id not in _deleting.recipes:
+        update_counter(
+            instance, created, Recipe, 'recipe_id', 'shopping_count'
+        )
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@unless_muted
+def recipe_counted(instance, created=None, **kwargs):
+    update_counter(instance, created, User, 'author_id', 'recipes_count')
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import QueryProfiler
+
+
+@contextmanager
+def query_budget(budget, using='default'):
+    """Роняет тест, если код внутри блока выполнил больше budget
+    SQL-запросов. В сообщении перечисляются повторяющиеся формы
+    запросов, обычно они и указывают на N+1"""
+    profiler = QueryProfiler()
+    with CaptureQueriesContext(connections[using]) as context:
+        with connections[using].execute_wrapper(profiler):
+            yield context
+    if profiler.count <= budget:
+        return
+    repeated = '\n'.join(
+        f'{count} x {fingerprint}'
+        for fingerprint, count in profiler.get_repeated()
+    )
+    raise AssertionError(
+        f'Выполнено {profiler.count} запросов при бюджете {budget}.\n'
+        f'Повторяющиеся запросы:\n{repeated or "нет"}'
+    )
+
+
+class QueryBudgetMixin:
+    """Примесь для TestCase с проверкой бюджета запросов"""
+
+    def assertQueryBudget(self, budget, using='default'):
+        return query_budget(budget, using)
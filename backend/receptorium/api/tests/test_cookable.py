@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from user.models import User
+from ..indexes import RecipeIngredientSetIndex
+
+
+class RecipeIngredientSetIndexTests(TestCase):
+    """Дозагрузка индекса видит правки строк ингредиентов,
+    сделанные в обход рецепта"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.salt, cls.sugar, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука')
+        )
+
+    def create_recipe(self, name, ingredients, days_ago):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text=name,
+            cooking_time=10, image='recipes/test.jpg'
+        )
+        for ingredient in ingredients:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return recipe
+
+    def match(self, index, *ingredients):
+        return [
+            recipe_id for recipe_id, _ in index.match(
+                [ingredient.pk for ingredient in ingredients], 0
+            )
+        ]
+
+    def test_row_edits(self):
+        old = self.create_recipe('Хлеб', [self.salt, self.flour], 2)
+        recent = self.create_recipe('Сироп', [self.sugar], 1)
+        index = RecipeIngredientSetIndex()
+        self.assertEqual(self.match(index, self.salt, self.flour), [old.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            row = old.recipes_ingredients.get(ingredient=self.flour)
+            row.ingredient = self.sugar
+            row.save()
+        self.assertEqual(
+            self.match(index, self.salt, self.sugar), [recent.pk, old.pk]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            old.recipes_ingredients.get(ingredient=self.salt).delete()
+        self.assertEqual(
+            self.match(index, self.sugar), [recent.pk, old.pk]
+        )
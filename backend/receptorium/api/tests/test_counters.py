@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from user.models import User
+
+
+class CountersTests(TestCase):
+    """Счётчики меняются при любых изменениях, включая каскадное
+    удаление и правки в админке, и ровно один раз на изменение"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='x'
+            )
+            for name in ('author', 'reader', 'other')
+        )
+
+    def create_recipe(self, name, author=None):
+        return Recipe.objects.create(
+            author=author or self.author, name=name, text=name,
+            cooking_time=10, image='recipes/test.jpg'
+        )
+
+    def assertCounters(self, recipe, favorites, shopping):
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.shopping_count),
+            (favorites, shopping)
+        )
+
+    def assertNoDrift(self):
+        call_command('reconcile_counters', '--check', stdout=StringIO())
+
+    def test_recipes_count(self):
+        recipe = self.create_recipe('Суп')
+        self.create_recipe('Каша')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+        recipe.author = self.other
+        recipe.save()
+        recipe.delete()
+        for user, count in ((self.author, 1), (self.other, 0)):
+            user.refresh_from_db()
+            self.assertEqual(user.recipes_count, count)
+        self.assertNoDrift()
+
+    def test_lists_outside_api(self):
+        recipe = self.create_recipe('Суп')
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        Favorite.objects.create(user=self.other, recipe=recipe)
+        ShoppingList.objects.create(user=self.reader, recipe=recipe)
+        self.assertCounters(recipe, 2, 1)
+        self.other.delete()
+        self.assertCounters(recipe, 1, 1)
+        cart = ShoppingList.objects.get()
+        cart.recipe = self.create_recipe('Каша')
+        cart.save()
+        self.assertCounters(recipe, 1, 0)
+        self.assertCounters(cart.recipe, 0, 1)
+        self.assertNoDrift()
+
+    def test_api_counts_once(self):
+        first, second = self.create_recipe('Суп'), self.create_recipe('Каша')
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        client.post(f'/api/recipes/{first.pk}/favorite/')
+        client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [first.pk, second.pk]}, format='json'
+        )
+        self.assertCounters(first, 1, 1)
+        self.assertCounters(second, 0, 1)
+        client.delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [first.pk]}, format='json'
+        )
+        client.delete(f'/api/recipes/{first.pk}/favorite/')
+        self.assertCounters(first, 0, 0)
+        self.assertNoDrift()
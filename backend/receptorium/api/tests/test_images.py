@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from recipes.images import (build_renditions, claim_image_tasks,
+                            enqueue_image_task, enqueue_missing_images,
+                            process_image_task)
+from recipes.models import ImageRendition, ImageTask, Recipe
+from user.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+EXIF_ORIENTATION = 0x0112
+
+
+def get_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return ContentFile(buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_WIDTHS=(320,))
+class ImagePipelineTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        self.recipe = Recipe(
+            author=author, name='Пирог', text='Пирог', cooking_time=10
+        )
+        self.recipe.image.save('photo.jpg', get_jpeg((600, 200)))
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for task_id in claim_image_tasks(10):
+                process_image_task(task_id)
+
+    def test_exif_orientation(self):
+        self.recipe.image.save('phone.jpg', get_jpeg((600, 200), 6))
+        sizes = {
+            Image.open(rendition.image).size
+            for rendition in build_renditions(self.recipe)
+        }
+        self.assertEqual(sizes, {(200, 600)})
+
+    def test_new_image_hides_old_renditions(self):
+        enqueue_image_task(self.recipe)
+        self.process()
+        self.assertEqual(self.recipe.renditions.count(), 2)
+        self.recipe.image.save('other.jpg', get_jpeg((400, 400)))
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_image_task(self.recipe)
+        self.assertFalse(self.recipe.renditions.exists())
+        self.process()
+        self.assertEqual(
+            set(self.recipe.renditions.values_list('width', flat=True)),
+            {320}
+        )
+
+    def test_stale_claims(self):
+        stale = timezone.now() - timedelta(
+            seconds=settings.IMAGE_TASK_CLAIM_TIMEOUT + 1
+        )
+        retried = ImageTask.objects.create(
+            recipe=self.recipe, status=ImageTask.PROCESSING,
+            claimed_at=stale, attempts=1
+        )
+        exhausted = ImageTask.objects.create(
+            recipe=self.recipe, status=ImageTask.PROCESSING,
+            claimed_at=stale, attempts=settings.IMAGE_TASK_MAX_ATTEMPTS
+        )
+        ImageTask.objects.create(
+            recipe=self.recipe, status=ImageTask.PROCESSING,
+            claimed_at=timezone.now()
+        )
+        self.assertEqual(claim_image_tasks(10), [retried.pk])
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, ImageTask.FAILED)
+
+    def test_enqueue_missing_images(self):
+        self.assertEqual(enqueue_missing_images(), 1)
+        self.assertEqual(enqueue_missing_images(), 0)
+        self.process()
+        self.assertEqual(enqueue_missing_images(), 0)
+        self.assertEqual(enqueue_missing_images(everything=True), 1)
+        self.assertEqual(ImageRendition.objects.count(), 2)
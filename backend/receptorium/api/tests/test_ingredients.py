@@ -0,0 +1,65 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+from ..cache import forget_local_versions
+
+
+class IngredientSearchTests(TestCase):
+    """Поиск ингредиентов идёт по индексу в памяти процесса,
+    повторный запрос не обращается к базе"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('соль', 'соль морская', 'морская соль', 'солод',
+                     'сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        # версии прошлых тестов откатились вместе с их транзакциями
+        forget_local_versions()
+        self.client = APIClient()
+
+    def search(self, query, **headers):
+        response = self.client.get(
+            '/api/ingredients/', {'name': query}, **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_names(self, response):
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_warm_search(self):
+        self.assertEqual(
+            self.get_names(self.search('Соль')),
+            ['соль', 'соль морская', 'морская соль']
+        )
+        with self.assertNumQueries(0):
+            response = self.search('сол')
+        self.assertEqual(
+            self.get_names(response),
+            ['солод', 'соль', 'соль морская', 'морская соль']
+        )
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/ingredients/', {'name': 'сол'},
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_visible(self):
+        self.search('сах')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='сахар тростниковый',
+                                      measurement_unit='г')
+        self.assertEqual(
+            self.get_names(self.search('сах')),
+            ['сахар', 'сахар тростниковый']
+        )
+
+    @override_settings(VERSION_CHECK_INTERVAL=0)
+    def test_without_interval(self):
+        self.search('сах')
+        with self.assertNumQueries(1):
+            self.search('сах')
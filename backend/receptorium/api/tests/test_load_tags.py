@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+
+
+@override_settings(VERSION_CHECK_INTERVAL=0)
+class LoadTagsVisibilityTests(TransactionTestCase):
+    """Теги, загруженные командой в отдельном процессе, видны
+    веб-процессу, который уже собрал снимок списка тегов, как только
+    он перечитает версию. Интервал проверки отключён, чтобы
+    не ждать его в тесте"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest(
+                'Другой процесс не видит базу SQLite в памяти, '
+                'задайте DB_TEST_NAME'
+            )
+
+    def run_load_tags(self, rows):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', delete=False
+        ) as file:
+            file.write(rows)
+        self.addCleanup(os.remove, file.name)
+        subprocess.run(
+            [sys.executable, 'manage.py', 'load_tags', '--path', file.name],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DB_NAME': connection.settings_dict['NAME']},
+            check=True,
+            capture_output=True
+        )
+
+    def get_tag_names(self, client):
+        return sorted(
+            tag['name']
+            for tag in json.loads(client.get('/api/tags/').content)
+        )
+
+    def test_import_from_another_process(self):
+        Tag.objects.create(
+            name='Завтрак', color_name='orange', slug='breakfast'
+        )
+        client = APIClient()
+        self.assertEqual(self.get_tag_names(client), ['Завтрак'])
+        self.run_load_tags(
+            'Поздний завтрак,orange,breakfast\nОбед,green,lunch\n'
+        )
+        self.assertEqual(
+            self.get_tag_names(client), ['Обед', 'Поздний завтрак']
+        )
@@ -0,0 +1,40 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from user.models import User
+
+
+class RecipeCursorTests(TestCase):
+    """Курсор отдаёт рецепты по убыванию id и не сочетается
+    с другой сортировкой"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author, name=name, text=name, cooking_time=10,
+                image='recipes/test.jpg', search_document=name
+            )
+            for name in ('Суп гороховый', 'Суп', 'Каша')
+        ]
+
+    def test_cursor(self):
+        client = APIClient()
+        response = client.get('/api/recipes/', {'cursor': '', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [recipe.pk for recipe in self.recipes[:0:-1]]
+        )
+        for param, value in (('search', 'суп'),
+                             ('ordering', '-favorites_count')):
+            with self.subTest(param=param):
+                response = client.get(
+                    '/api/recipes/', {'cursor': '', param: value}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, str(response.json()['cursor']))
@@ -0,0 +1,60 @@
+import json
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingList
+from user.models import User
+from ..testing import QueryBudgetMixin, query_budget
+
+
+@override_settings(QUERY_PROFILER_ENABLED=True)
+class QueryProfilerMiddlewareTests(TestCase):
+    """Профилировщик учитывает и запросы, выполненные
+    при чтении потокового ответа"""
+
+    def test_streaming_response(self):
+        buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='x'
+        )
+        recipe = Recipe.objects.create(
+            author=buyer, name='Суп', text='Сварите',
+            cooking_time=10, image='recipes/test.jpg'
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            ),
+            amount=5
+        )
+        ShoppingList.objects.create(user=buyer, recipe=recipe)
+        client = APIClient()
+        client.force_authenticate(buyer)
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    HTTP_ACCEPT='text/csv'
+                )
+                self.assertEqual(logs.output, [])
+                self.assertIn(
+                    'соль', b''.join(response.streaming_content).decode()
+                )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], len(queries))
+        self.assertIn('queries"', response['Server-Timing'])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def test_budget(self):
+        with self.assertQueryBudget(2):
+            list(User.objects.all())
+            list(User.objects.all())
+        with self.assertRaisesMessage(AssertionError, '3 x SELECT'):
+            with query_budget(2):
+                for _ in range(3):
+                    list(User.objects.filter(pk=1))
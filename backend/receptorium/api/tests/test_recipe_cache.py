@@ -0,0 +1,80 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from user.models import User
+
+POPULAR = {'ordering': '-favorites_count'}
+
+
+class RecipeCacheTests(TestCase):
+    """Кэш ответов и валидаторы меняются вместе с данными,
+    от которых зависит выдача"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='x'
+            )
+            for name in ('author', 'reader')
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=name, text=name,
+                cooking_time=10, image='recipes/test.jpg'
+            )
+            for name in ('Суп', 'Каша')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+
+    def get_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_popular_order_follows_favorites(self):
+        soup, porridge = self.recipes
+        response = self.client.get('/api/recipes/', POPULAR)
+        self.assertEqual(self.get_ids(response), [porridge.pk, soup.pk])
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader_client.post(f'/api/recipes/{soup.pk}/favorite/')
+        response = self.client.get(
+            '/api/recipes/', POPULAR, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(self.get_ids(response), [soup.pk, porridge.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader_client.delete(
+                '/api/recipes/favorite/', {'recipes': [soup.pk]},
+                format='json'
+            )
+            self.reader_client.post(
+                '/api/recipes/favorite/', {'recipes': [porridge.pk]},
+                format='json'
+            )
+        response = self.client.get('/api/recipes/', POPULAR)
+        self.assertEqual(self.get_ids(response), [porridge.pk, soup.pk])
+
+    def test_user_flags_revalidation(self):
+        soup, _ = self.recipes
+        for url in ('/api/recipes/', f'/api/recipes/{soup.pk}/'):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('Last-Modified', response)
+                self.assertIn('Last-Modified', self.client.get(url))
+        etag = response['ETag']
+        self.assertEqual(
+            self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader_client.post(f'/api/recipes/{soup.pk}/favorite/')
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_favorited'])
@@ -0,0 +1,166 @@
+from itertools import product
+from unittest import skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingList, Tag
+from user.models import User
+from ..fiters import RecipeFilter
+
+FLAGS = (None, '0', '1')
+
+
+class RecipeFiltersTests(TestCase):
+    """Фильтры по избранному и списку покупок сочетаются с тегами
+    и автором и проверяются подзапросами EXISTS по индексам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='x'
+            )
+            for number in range(2)
+        ]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.tags = [
+            Tag.objects.create(name=name, color_name=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', 'orange', 'breakfast'),
+                ('Обед', 'green', 'lunch'),
+            )
+        ]
+        cls.recipes = {}
+        for number, (author, tag, favorited, in_cart) in enumerate(product(
+            cls.authors, cls.tags, (False, True), (False, True)
+        )):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/test.jpg'
+            )
+            recipe.tags.set([tag])
+            if favorited:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if in_cart:
+                ShoppingList.objects.create(user=cls.reader, recipe=recipe)
+            cls.recipes[recipe.pk] = (author, tag, favorited, in_cart)
+
+    def get_params(self, favorited, in_cart, tag, author):
+        params = {'limit': len(self.recipes)}
+        if favorited is not None:
+            params['is_favorited'] = favorited
+        if in_cart is not None:
+            params['is_in_shopping_cart'] = in_cart
+        if tag is not None:
+            params['tags'] = tag.slug
+        if author is not None:
+            params['author'] = author.pk
+        return params
+
+    def get_expected(self, user, favorited, in_cart, tag, author):
+        """Считает ожидаемый результат без базы: флаг 1 оставляет
+        рецепты из списка, 0 исключает их, у анонима списки пусты"""
+        expected = set()
+        for pk, (recipe_author, recipe_tag, *lists) in self.recipes.items():
+            if not user.is_authenticated:
+                lists = (False, False)
+            if any(
+                flag is not None and (flag == '1') != in_list
+                for flag, in_list in zip((favorited, in_cart), lists)
+            ):
+                continue
+            if tag not in (None, recipe_tag):
+                continue
+            if author not in (None, recipe_author):
+                continue
+            expected.add(pk)
+        return expected
+
+    def test_matrix(self):
+        for user in (AnonymousUser(), self.reader):
+            client = APIClient()
+            if user.is_authenticated:
+                client.force_authenticate(user)
+            for combination in product(
+                FLAGS, FLAGS, (None, self.tags[0]), (None, self.authors[0])
+            ):
+                params = self.get_params(*combination)
+                with self.subTest(user=str(user), **params):
+                    response = client.get('/api/recipes/', params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        {item['id'] for item in response.json()['results']},
+                        self.get_expected(user, *combination)
+                    )
+
+    def get_filtered_queryset(self, user, params):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = user
+        return RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request
+        ).qs
+
+    def test_query_shape(self):
+        """Все фильтры сочетаются в одном запросе через EXISTS,
+        без JOIN списков пользователя и без DISTINCT"""
+        for combination in product(
+            FLAGS, FLAGS, (None, self.tags[0]), (None, self.authors[0])
+        ):
+            params = self.get_params(*combination)
+            with self.subTest(**params):
+                sql = str(self.get_filtered_queryset(
+                    self.reader, params
+                ).query).upper()
+                expected_exists = sum(
+                    value is not None for value in combination[:3]
+                )
+                self.assertEqual(sql.count('EXISTS'), expected_exists)
+                self.assertNotIn('DISTINCT', sql)
+                self.assertNotIn('JOIN', sql.split('WHERE')[0])
+
+    def test_anonymous_lists(self):
+        queryset = self.get_filtered_queryset(
+            AnonymousUser(), {'is_favorited': '1'}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(list(queryset), [])
+
+    def test_unknown_tag(self):
+        response = APIClient().get('/api/recipes/', {'tags': 'dinner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.json())
+
+    @skipUnless(connection.vendor == 'sqlite', 'План запроса SQLite')
+    def test_query_plan_uses_indexes(self):
+        """Каждый подзапрос ищет строку по составному индексу,
+        полный просмотр остаётся только у самой таблицы рецептов"""
+        for combination in product(
+            ('0', '1'), ('0', '1'), (self.tags[0],), (None, self.authors[0])
+        ):
+            params = self.get_params(*combination)
+            with self.subTest(**params):
+                plan = self.get_filtered_queryset(
+                    self.reader, params
+                ).explain().splitlines()
+                searches = [
+                    line for line in plan
+                    if 'SEARCH U0 USING COVERING INDEX' in line
+                ]
+                self.assertEqual(len(searches), 3)
+                self.assertEqual(
+                    sum('(user_id=? AND recipe_id=?)' in line
+                        for line in searches),
+                    2
+                )
+                self.assertEqual(
+                    [line for line in plan if ' SCAN ' in line
+                     and not line.endswith(' SCAN recipes_recipe')],
+                    []
+                )
@@ -0,0 +1,140 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Tag)
+from user.models import User
+from ..cache import get_response_cache
+from ..testing import QueryBudgetMixin
+
+PAGE_SIZES = (6, 50, 200)
+
+
+class RecipeQueriesTests(QueryBudgetMixin, TestCase):
+    """Страница рецептов с тегами, ингредиентами, автором и флагами
+    пользователя загружается за одно и то же число запросов
+    при любом размере страницы, остальные частые запросы
+    укладываются в бюджет"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='x'
+            )
+            for number in range(5)
+        ]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        tags = [
+            Tag.objects.create(name=name, color_name=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', 'orange', 'breakfast'),
+                ('Обед', 'green', 'lunch'),
+            )
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        ingredients = list(Ingredient.objects.all())
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}',
+                text=f'Текст {number}',
+                cooking_time=10,
+                image='recipes/test.jpg'
+            )
+            for number in range(max(PAGE_SIZES))
+        )
+        recipes = list(Recipe.objects.order_by('pk'))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(number + shift) % len(ingredients)],
+                amount=shift + 1
+            )
+            for number, recipe in enumerate(recipes)
+            for shift in range(3)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in tags
+        )
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe=recipe) for recipe in recipes[::3]
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=cls.reader, recipe=recipe)
+            for recipe in recipes[::4]
+        )
+
+    def get_client(self, user):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def assertPageQueries(self, user, expected):
+        client = self.get_client(user)
+        # Первый запрос создаёт версии данных в хранилище, его не считаем
+        client.get('/api/recipes/')
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                get_response_cache().clear()
+                with self.assertNumQueries(expected):
+                    response = client.get(
+                        f'/api/recipes/?limit={page_size}'
+                    )
+                results = response.json()['results']
+                self.assertEqual(len(results), page_size)
+                recipe = results[0]
+                self.assertEqual(len(recipe['tags']), 2)
+                self.assertEqual(len(recipe['ingredients']), 3)
+                self.assertIn('is_subscribed', recipe['author'])
+        if user is not None:
+            self.assertUserFlags(user, results)
+
+    def assertUserFlags(self, user, results):
+        favorited = set(
+            user.favorites.values_list('recipe', flat=True)
+        )
+        for recipe in results:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in favorited
+            )
+            self.assertEqual(
+                recipe['author']['is_subscribed'],
+                recipe['author']['id'] == self.authors[0].pk
+            )
+
+    def test_anonymous_page(self):
+        # версии, валидаторы (2), count, рецепты, теги, копии фото,
+        # ингредиенты, авторы
+        self.assertPageQueries(None, 9)
+
+    def test_authenticated_page(self):
+        # то же и версия пользователя, избранное, список покупок,
+        # подписки
+        self.assertPageQueries(self.reader, 13)
+
+    def test_hot_endpoints(self):
+        # у читателя 40 рецептов в ленте, 50 в списке покупок
+        client = self.get_client(self.reader)
+        for path, budget in (
+            ('/api/recipes/feed/?limit=50', 8),
+            ('/api/users/subscriptions/?recipes_limit=3', 4),
+            ('/api/recipes/download_shopping_cart/', 1),
+        ):
+            with self.subTest(path=path):
+                with self.assertQueryBudget(budget):
+                    response = client.get(path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,104 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (ImageTask, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, ShoppingList, Tag)
+from user.models import User
+
+
+class RecipeUpdateTests(TestCase):
+    """Правка рецепта пишет только изменения и укладывается
+    в постоянное число запросов вместе с обработчиками коммита"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.buyers = [
+            User.objects.create_user(
+                username=f'buyer{number}',
+                email=f'buyer{number}@example.com',
+                password='x'
+            )
+            for number in range(3)
+        ]
+        cls.tag = Tag.objects.create(
+            name='Обед', color_name='green', slug='lunch'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text='Сварите',
+            cooking_time=10, image='recipes/test.jpg'
+        )
+        self.recipe.tags.set([self.tag])
+        for ingredient in self.ingredients[:4]:
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=1
+            )
+        for buyer in self.buyers:
+            ShoppingList.objects.create(user=buyer, recipe=self.recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, amounts, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {
+                    'tags': [self.tag.pk],
+                    'ingredients': [
+                        {'id': self.ingredients[number].pk, 'amount': amount}
+                        for number, amount in amounts.items()
+                    ],
+                    **fields
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_ingredient_changes(self):
+        """Удалена одна строка, изменена одна и добавлена одна"""
+        with self.assertNumQueries(34):
+            self.patch({1: 5, 2: 1, 3: 1, 4: 2})
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            sorted(self.recipe.recipes_ingredients.values_list(
+                'ingredient__name', 'amount'
+            )),
+            [('ингредиент 1', 5), ('ингредиент 2', 1),
+             ('ингредиент 3', 1), ('ингредиент 4', 2)]
+        )
+        for buyer in self.buyers:
+            self.assertEqual(
+                dict(ShoppingCartIngredient.objects.filter(
+                    user=buyer
+                ).values_list('ingredient__name', 'amount')),
+                {'ингредиент 1': 5, 'ингредиент 2': 1,
+                 'ингредиент 3': 1, 'ингредиент 4': 2}
+            )
+        self.assertIn('ингредиент 4', self.recipe.search_document)
+        self.assertFalse(ImageTask.objects.exists())
+
+    def test_unchanged_fields(self):
+        """Без новых ингредиентов, названия и фото поиск
+        не пересобирается и фото не ставится в очередь"""
+        self.recipe.search_document = 'прежний'
+        self.recipe.save(update_fields=['search_document'])
+        with self.assertNumQueries(19):
+            self.patch(
+                {0: 1, 1: 1, 2: 1, 3: 1},
+                name='Суп', text='Сварите', cooking_time=20
+            )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cooking_time, 20)
+        self.assertEqual(self.recipe.search_document, 'прежний')
+        self.assertFalse(ImageTask.objects.exists())
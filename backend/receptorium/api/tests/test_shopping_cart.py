@@ -0,0 +1,120 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, ShoppingList)
+from user.models import User
+
+
+class ShoppingCartTotalsTests(TestCase):
+    """Итоговые суммы списка покупок остаются верными при любых
+    изменениях, а не только при запросах к API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='x'
+        )
+        cls.salt, cls.sugar, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука')
+        )
+
+    def setUp(self):
+        self.recipe = self.create_recipe('Пирог', {self.salt: 5})
+        self.other = self.create_recipe('Блины', {self.salt: 2})
+        for recipe in (self.recipe, self.other):
+            ShoppingList.objects.create(user=self.buyer, recipe=recipe)
+
+    def create_recipe(self, name, amounts):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text=name,
+            cooking_time=10, image='recipes/test.jpg'
+        )
+        for ingredient, amount in amounts.items():
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+    def get_totals(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.buyer
+        ).values_list('ingredient__name', 'amount'))
+
+    def assertNoDrift(self):
+        call_command('rebuild_shopping_cart', '--check', stdout=StringIO())
+
+    def test_cart_changes(self):
+        self.assertEqual(self.get_totals(), {'соль': 7})
+        ShoppingList.objects.filter(recipe=self.other).delete()
+        self.assertEqual(self.get_totals(), {'соль': 5})
+        self.assertNoDrift()
+
+    def test_recipe_ingredient_edit(self):
+        row = self.recipe.recipes_ingredients.get()
+        row.ingredient = self.sugar
+        row.amount = 3
+        row.save()
+        RecipeIngredient.objects.create(
+            recipe=self.other, ingredient=self.flour, amount=100
+        )
+        self.assertEqual(
+            self.get_totals(), {'соль': 2, 'сахар': 3, 'мука': 100}
+        )
+        self.assertNoDrift()
+
+    def test_shopping_list_edit(self):
+        cart = ShoppingList.objects.get(recipe=self.recipe)
+        cart.recipe = self.create_recipe('Сироп', {self.sugar: 50})
+        cart.save()
+        self.assertEqual(self.get_totals(), {'соль': 2, 'сахар': 50})
+        self.assertNoDrift()
+
+    def test_recipe_delete(self):
+        self.recipe.delete()
+        self.assertEqual(self.get_totals(), {'соль': 2})
+        self.assertNoDrift()
+
+    def test_author_delete(self):
+        self.assertEqual(self.get_totals(), {'соль': 7})
+        self.author.delete()
+        self.assertEqual(self.get_totals(), {})
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        response = client.get(
+            '/api/recipes/download_shopping_cart/', HTTP_ACCEPT='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(
+            'соль', b''.join(response.streaming_content).decode()
+        )
+        self.assertNoDrift()
+
+    def test_cart_add_errors(self):
+        """«Уже добавлен» отвечаем только на повтор, ошибка
+        пересчёта сумм не маскируется под него"""
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        response = client.post(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 400)
+        recipe = self.create_recipe('Сироп', {self.sugar: 50})
+        with mock.patch(
+            'api.signals.refresh_shopping_cart_totals',
+            side_effect=IntegrityError
+        ):
+            with self.assertRaises(IntegrityError):
+                client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertFalse(
+            ShoppingList.objects.filter(recipe=recipe).exists()
+        )
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from recipes.models import Recipe
+from user.models import User
+from ..cache import (RECIPES_VERSION_KEY, bump_version, get_recipe_version_key,
+                     get_user_version_key, get_versions)
+from ..models import Version
+
+
+class VersionsTests(TestCase):
+    """Версии читаются и меняются одним запросом, а версии
+    удалённых рецептов и пользователей удаляются"""
+
+    def test_bump(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_versions(RECIPES_VERSION_KEY), [''])
+        bump_version(RECIPES_VERSION_KEY)
+        version, = get_versions(RECIPES_VERSION_KEY)
+        with self.assertNumQueries(1):
+            bump_version(RECIPES_VERSION_KEY)
+        self.assertNotIn(version, get_versions(RECIPES_VERSION_KEY))
+
+    def test_deleted_objects(self):
+        author, reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='x'
+            )
+            for name in ('author', 'reader')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=author, name='Суп', text='Сварите',
+                cooking_time=10, image='recipes/test.jpg'
+            )
+            reader.favorites.create(recipe=recipe)
+        keys = [
+            get_recipe_version_key(recipe.pk),
+            get_user_version_key(author.pk),
+            get_user_version_key(reader.pk),
+        ]
+        self.assertEqual(
+            set(Version.objects.filter(
+                key__in=keys
+            ).values_list('key', flat=True)),
+            {keys[0], keys[2]}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            author.delete()
+            reader.delete()
+        self.assertFalse(Version.objects.filter(key__in=keys).exists())
+        self.assertTrue(
+            Version.objects.filter(key=RECIPES_VERSION_KEY).exists()
+        )
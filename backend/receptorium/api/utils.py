@@ -1,26 +1,189 @@
-from django.shortcuts import get_object_or_404
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import Http404
 from rest_framework import serializers
 
-from recipes.models import Ingredient, RecipeIngredient
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList)
+from recipes.utils import refresh_recipes_cart_totals
+from user.models import User
+from .signals import receivers_muted
+
+
+def get_user_flag(user, model, **filters):
+    """Возвращает выражение, проверяющее наличие связи пользователя
+    с объектом, для анонимного пользователя всегда False"""
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(model.objects.filter(user=user, **filters))
+
+
+def get_recipe_queryset(user):
+    """Возвращает queryset рецептов, который загружает страницу
+    с тегами, ингредиентами, автором и флагами пользователя
+    за постоянное число запросов"""
+    return Recipe.objects.prefetch_related(
+        'tags',
+        'renditions',
+        Prefetch(
+            'recipes_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+        Prefetch('author', queryset=User.objects.annotate(
+            is_subscribed=get_user_flag(user, Follow, author=OuterRef('pk'))
+        ))
+    ).annotate(
+        is_favorited=get_user_flag(user, Favorite, recipe=OuterRef('pk')),
+        is_in_shopping_cart=get_user_flag(
+            user, ShoppingList, recipe=OuterRef('pk')
+        )
+    ).defer('search_document', 'search_vector')
+
+
+def overlay_user_flags(recipes, user):
+    """Проставляет флаги пользователя в сериализованные рецепты,
+    полученные из кэша"""
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    favorited = set(Favorite.objects.filter(
+        user=user, recipe__in=recipe_ids
+    ).values_list('recipe', flat=True))
+    in_shopping_cart = set(ShoppingList.objects.filter(
+        user=user, recipe__in=recipe_ids
+    ).values_list('recipe', flat=True))
+    subscribed = set(Follow.objects.filter(
+        user=user, author__in=author_ids
+    ).values_list('author', flat=True))
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_shopping_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscribed
+        )
+    return recipes
+
+
+def get_query_param(request, name, field, default=None):
+    """Возвращает значение параметра запроса, проверенное полем
+    сериализатора, ошибка привязывается к имени параметра"""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return field.run_validation(value)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({name: error.detail})
+
+
+def get_recipes_limit(request):
+    """Возвращает проверенное значение recipes_limit из запроса"""
+    return get_query_param(
+        request, 'recipes_limit', serializers.IntegerField(min_value=0)
+    )
+
+
+def get_ingredient_ids(request):
+    """Возвращает проверенный список id ингредиентов из запроса,
+    id можно передать несколькими параметрами или через запятую"""
+    values = [
+        value
+        for param in request.query_params.getlist('ingredients')
+        for value in param.split(',') if value
+    ]
+    field = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+    try:
+        return field.run_validation(values)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'ingredients': error.detail})
+
+
+def get_subscriptions_queryset(user, recipes_limit=None):
+    """Возвращает queryset авторов, на которых подписан пользователь,
+    с последними рецептами каждого автора"""
+    recipes = Recipe.objects.prefetch_related('renditions')
+    if recipes_limit is not None:
+        recipes = recipes.filter(pk__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:recipes_limit]
+        ))
+    return User.objects.filter(following__user=user).annotate(
+        is_subscribed=Value(True, output_field=BooleanField())
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+    ).order_by('-pk')
+
+
+def check_ingredients_exist(ingredient_list):
+    """Проверяет одним запросом, что все ингредиенты существуют"""
+    ids = [ingredient['id'] for ingredient in ingredient_list]
+    found = Ingredient.objects.in_bulk(ids)
+    if len(found) != len(set(ids)):
+        raise Http404('Ингредиент не найден')
 
 
 def ingredient_for_recipe_create(ingredient_list, recipe_obj):
-    """Добавляет ингредиенты в рецепт при его создании
-    или редактировании"""
-    ingredient_obj_list = []
-    for ingredient in ingredient_list:
-        current_ingredient = get_object_or_404(
-            Ingredient,
-            id=ingredient['id']
+    """Добавляет ингредиенты в рецепт при его создании"""
+    check_ingredients_exist(ingredient_list)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            ingredient_id=ingredient['id'],
+            recipe=recipe_obj,
+            amount=ingredient['amount']
         )
-        ingredient_obj_list.append(
+        for ingredient in ingredient_list
+    )
+
+
+def ingredient_for_recipe_update(ingredient_list, recipe_obj):
+    """Применяет к рецепту только изменения в ингредиентах
+    и возвращает id изменённых ингредиентов. Строки пишутся
+    без обработчиков сигналов, поэтому суммы списков покупок
+    пересчитываются здесь одним запросом на все изменения,
+    а поиск и версии рецепта обновляет вызывающий код"""
+    check_ingredients_exist(ingredient_list)
+    amounts = {
+        ingredient['id']: ingredient['amount']
+        for ingredient in ingredient_list
+    }
+    current = {
+        recipe_ingredient.ingredient_id: recipe_ingredient
+        for recipe_ingredient in recipe_obj.recipes_ingredients.all()
+    }
+    removed = current.keys() - amounts.keys()
+    added = amounts.keys() - current.keys()
+    changed = [
+        recipe_ingredient
+        for ingredient_id, recipe_ingredient in current.items()
+        if ingredient_id in amounts
+        and recipe_ingredient.amount != amounts[ingredient_id]
+    ]
+    for recipe_ingredient in changed:
+        recipe_ingredient.amount = amounts[recipe_ingredient.ingredient_id]
+    if removed:
+        with receivers_muted():
+            RecipeIngredient.objects.filter(
+                pk__in=[current[pk].pk for pk in removed]
+            ).delete()
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+    if added:
+        RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
-                ingredient=current_ingredient,
+                ingredient_id=ingredient_id,
                 recipe=recipe_obj,
-                amount=ingredient['amount']
+                amount=amounts[ingredient_id]
             )
+            for ingredient_id in added
         )
-    RecipeIngredient.objects.bulk_create(ingredient_obj_list)
+    changed_ingredients = removed | added | {
+        recipe_ingredient.ingredient_id for recipe_ingredient in changed
+    }
+    if changed_ingredients:
+        refresh_recipes_cart_totals([recipe_obj.pk], changed_ingredients)
+    return changed_ingredients
 
 
 def double_checker(list_of_arr: list):
@@ -1,44 +1,97 @@
-from django.shortcuts import get_object_or_404
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import (IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
+from rest_framework.serializers import IntegerField
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import (Favorite, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingList, Tag)
-from user.models import User
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag)
+from recipes.feed import get_feed_recipe_ids
+from .cache import (get_cached_validators, get_request_digest,
+                    get_user_version, is_ordered_by_counters)
+from .exporters import SHOPPING_CART_CHUNK_SIZE, SHOPPING_CART_EXPORTERS
 from .fiters import RecipeFilter
-from .functions import object_add_or_delete
-from .pagination import RecipePageNumberPagination
+from .functions import (bulk_subscribe_or_unsubscribe, object_add_or_delete,
+                        objects_bulk_add_or_delete, subscribe_or_unsubscribe)
+from .indexes import (ingredient_index, ingredient_snapshot,
+                      recipe_ingredient_set_index, similar_recipes_index,
+                      tag_snapshot)
+from .mixins import ConditionalGetMixin, RecipeCacheMixin
+from .pagination import (RecipeFeedPagination, RecipeMatchPagination,
+                         RecipePageNumberPagination)
 from .permissions import IsAuthorOrAuthenticatedOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (IngredientSerializer, RecipeCreateSerializer,
+                          RecipeForFavoriteSubscriptionsSerializer,
                           RecipeSerializer, SubscriptionsSerializer,
                           TagSerializer)
+from .utils import (get_ingredient_ids, get_query_param, get_recipe_queryset,
+                    get_recipes_limit, get_subscriptions_queryset)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
     permission_classes = [IsAuthenticatedOrReadOnly, ]
 
+    def get_list_validators(self, request):
+        ingredient_index.refresh()
+        return (
+            [ingredient_index.version, get_request_digest(request)],
+            ingredient_index.updated_at
+        )
+
+    def get_object_validators(self, request, pk):
+        updated_at = Ingredient.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first()
+        return [pk, updated_at], updated_at
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get(api_settings.SEARCH_PARAM):
+            return self.get_snapshot_response(request, ingredient_snapshot)
+        return self.get_conditional_response(
+            self.get_list_validators(request), self.search, request
+        )
+
+    def search(self, request):
+        return Response(ingredient_index.search(
+            request.query_params.get(api_settings.SEARCH_PARAM),
+            settings.INGREDIENT_SEARCH_LIMIT
+        ))
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тэгов"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, ]
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.get_snapshot_response(request, tag_snapshot)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def get_object_validators(self, request, pk):
+        updated_at = Tag.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first()
+        return [pk, updated_at], updated_at
+
+
+class RecipeViewSet(ConditionalGetMixin, RecipeCacheMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для рецептов"""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
@@ -46,13 +99,74 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     permission_classes = [IsAuthorOrAuthenticatedOrReadOnly]
     pagination_class = RecipePageNumberPagination
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            if self.anonymous_payload:
+                return get_recipe_queryset(AnonymousUser())
+            return get_recipe_queryset(self.request.user)
+        return Recipe.objects.all()
+
+    def get_recipes_updated_at(self):
+        recipes = self.filter_queryset(Recipe.objects.all()).aggregate(
+            updated_at=Max('updated_at'), total=Count('id', distinct=True)
+        )
+        tags_updated_at = Tag.objects.aggregate(
+            updated_at=Max('updated_at')
+        )['updated_at']
+        return (
+            [recipes['updated_at'], recipes['total'], tags_updated_at],
+            max(filter(None, [recipes['updated_at'], tags_updated_at]),
+                default=None)
+        )
+
+    def get_recipe_updated_at(self, pk):
+        updated_at = Recipe.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first()
+        return [updated_at], updated_at
+
+    def get_last_modified(self, request, last_modified):
+        """Флаги is_favorited и is_in_shopping_cart меняются
+        без updated_at рецептов, но учтены в ETag версией
+        пользователя, поэтому ему отдаётся только ETag"""
+        if request.user.is_authenticated:
+            return None
+        return last_modified
+
+    def get_list_validators(self, request):
+        key = self.get_cache_key(request)
+        etag_parts, last_modified = get_cached_validators(
+            key, self.get_recipes_updated_at
+        )
+        if is_ordered_by_counters(request):
+            # порядок меняется без updated_at, проверяем только ETag
+            last_modified = None
+        return (
+            etag_parts + [
+                key,
+                get_request_digest(request),
+                get_user_version(request.user)
+            ],
+            self.get_last_modified(request, last_modified)
+        )
+
+    def get_object_validators(self, request, pk):
+        key = self.get_cache_key(request, pk)
+        etag_parts, last_modified = get_cached_validators(
+            key, lambda: self.get_recipe_updated_at(pk)
+        )
+        return (
+            etag_parts + [key, get_user_version(request.user)],
+            self.get_last_modified(request, last_modified)
+        )
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeSerializer
         return RecipeCreateSerializer
 
-
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -64,30 +178,116 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return object_add_or_delete(ShoppingList, request, pk)
 
-    @action(methods=['get'], detail=False)
+    @action(methods=['post', 'delete'], detail=False, url_path='favorite')
+    def favorite_bulk(self, request):
+        return objects_bulk_add_or_delete(Favorite, request)
+
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='shopping_cart'
+    )
+    def shopping_cart_bulk(self, request):
+        return objects_bulk_add_or_delete(ShoppingList, request)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        pagination_class=RecipeMatchPagination
+    )
+    def cookable(self, request):
+        max_missing = get_query_param(
+            request,
+            'max_missing',
+            IntegerField(min_value=0, max_value=settings.COOKABLE_MAX_MISSING),
+            default=settings.COOKABLE_MAX_MISSING
+        )
+        matches = self.paginate_queryset(recipe_ingredient_set_index.match(
+            get_ingredient_ids(request), max_missing
+        ))
+        missing = dict(matches)
+        recipes = get_recipe_queryset(request.user).in_bulk(missing)
+        serializer = RecipeSerializer(
+            [recipes[pk] for pk in missing if pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        for recipe in serializer.data:
+            recipe['missing_ingredients'] = missing[recipe['id']]
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=RecipeFeedPagination
+    )
+    def feed(self, request):
+        recipe_ids = self.paginator.paginate_feed(
+            request,
+            lambda before, limit: get_feed_recipe_ids(
+                request.user.pk, before, limit
+            )
+        )
+        recipes = get_recipe_queryset(request.user).in_bulk(recipe_ids)
+        serializer = RecipeSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk):
+        recipe = self.get_object()
+        scores = dict(similar_recipes_index.similar(recipe.pk))
+        recipes = Recipe.objects.prefetch_related('renditions').in_bulk(
+            scores
+        )
+        serializer = RecipeForFavoriteSubscriptionsSerializer(
+            [recipes[pk] for pk in scores if pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        for similar_recipe in serializer.data:
+            similar_recipe['similarity'] = round(
+                scores[similar_recipe['id']], 3
+            )
+        return Response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer]
+    )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_lists__user=request.user
-        ).values(
+        export_format = request.accepted_renderer.format
+        exporter, content_type = SHOPPING_CART_EXPORTERS[export_format]
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).order_by(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_sum=Sum('amount')).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-            'ingredient_sum'
-        )
-        text = ''
-        for ingredient in ingredients:
-            text += f'{ingredient[0]} - {ingredient[2]} {ingredient[1]}\r\n'
-        response = HttpResponse(text, content_type='text/plain,charset=utf8')
-        response['Content-Disposition'] = 'attachment; filename=shopping.txt'
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        rows = ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            exporter(rows), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping.{export_format}'
+        )
         return response
 
 
 class CustomUserViewSet(UserViewSet):
     """Кастомный вьюсет для юзера"""
+    pagination_class = RecipePageNumberPagination
+
     @action(methods=['get'], detail=False)
     def subscriptions(self, request):
-        following_users = User.objects.filter(following__user=request.user)
+        following_users = get_subscriptions_queryset(
+            request.user, get_recipes_limit(request)
+        )
         page = self.paginate_queryset(following_users)
         if page is not None:
             serialaizer = SubscriptionsSerializer(
@@ -101,33 +301,8 @@ class CustomUserViewSet(UserViewSet):
 
     @action(methods=['post', 'delete'], detail=True)
     def subscribe(self, request, id):
-        following_user = get_object_or_404(User, id=id)
-        if request.user == following_user:
-            return Response(
-                data={"error": "Нельзя подписываться на самого себя"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if request.method == 'POST':
-            _, created = Follow.objects.get_or_create(
-                user=request.user, author=following_user
-            )
-            if not created:
-                return Response(
-                    data={"errors": "Автор уже добавлен в список"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            serializer = SubscriptionsSerializer(
-                following_user, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not Follow.objects.filter(
-            user=request.user, author=following_user
-        ).exists():
-            return Response(
-                data={"errors": "Автор отсутствует в списке"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        Follow.objects.get(user=request.user, author=following_user).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
+        return subscribe_or_unsubscribe(request, id)
 
+    @action(methods=['post', 'delete'], detail=False, url_path='subscribe')
+    def subscribe_bulk(self, request):
+        return bulk_subscribe_or_unsubscribe(request)
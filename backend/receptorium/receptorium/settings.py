@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,7 +64,20 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'TEST': {
+            'NAME': os.getenv('DB_TEST_NAME'),
+        },
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -106,6 +120,48 @@ AUTH_USER_MODEL = 'user.User'
 
 RECIPE_PER_PAGE = 6
 
+INGREDIENT_SEARCH_LIMIT = 50
+
+COOKABLE_MAX_MISSING = 3
+
+FEED_FANOUT_LIMIT = 100
+
+FEED_BACKFILL_SIZE = 1000
+
+BULK_MAX_ITEMS = 100
+
+QUERY_PROFILER_ENABLED = os.getenv(
+    'QUERY_PROFILER_ENABLED', default='False'
+) == 'True'
+
+QUERY_PROFILER_REPEAT_THRESHOLD = 5
+
+SIMILAR_RECIPES_INDEX_PATH = os.path.join(
+    BASE_DIR, 'indexes', 'similar_recipes.bin'
+)
+
+RECIPE_CACHE_ALIAS = 'default'
+
+VERSION_CHECK_INTERVAL = 1
+
+RECIPE_CACHE_TIMEOUT = 60 * 15
+
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+
+RECIPE_IMAGE_QUALITY = 80
+
+IMAGE_TASK_MAX_ATTEMPTS = 3
+
+IMAGE_TASK_CLAIM_TIMEOUT = 60 * 10
+
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+RECIPE_IMAGE_MAX_PIXELS = 4096 * 4096
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
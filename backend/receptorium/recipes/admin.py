@@ -7,6 +7,7 @@ from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 2
+    autocomplete_fields = ('ingredient',)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -22,30 +23,47 @@ class IngredientAdmin(admin.ModelAdmin):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('author', 'name', 'text', 'favorite_total')
-    search_fields = ('name', 'author', 'tags')
-    list_filter = ('author', 'tags')
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author', 'tags')
+    show_full_result_count = False
     inlines = (RecipeIngredientInline,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(
+            'search_document', 'search_vector'
+        )
+
+    @admin.display(
+        description='Добавлений в избранное', ordering='favorites_count'
+    )
     def favorite_total(self, obj):
-        return obj.favorites.all().count()
+        return obj.favorites_count
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
-    search_fields = ('user',)
-    list_filter = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
 
 
 class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user',)
-    list_filter = ('user',)
+    search_fields = ('user__username', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
 
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    search_fields = ('user',)
-    list_filter = ('user',)
+    search_fields = ('user__username', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
 
 
 admin.site.register(Ingredient, IngredientAdmin)
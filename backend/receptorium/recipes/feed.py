@@ -0,0 +1,125 @@
+import heapq
+from collections import defaultdict
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import FeedItem, Follow, Recipe
+
+
+def is_heavy_follower(user_id):
+    """Проверяет, читает ли пользователь ленту из таблицы FeedItem"""
+    return (
+        Follow.objects.filter(user=user_id).count()
+        > settings.FEED_FANOUT_LIMIT
+    )
+
+
+def merge_author_feeds(author_ids, before, limit):
+    """Сливает последние рецепты каждого автора в одну ленту:
+    по каждому автору берётся не больше limit рецептов
+    по индексу (author, -id), затем списки сливаются кучей"""
+    querysets = []
+    for author_id in author_ids:
+        recipes = Recipe.objects.filter(author=author_id)
+        if before is not None:
+            recipes = recipes.filter(pk__lt=before)
+        querysets.append(
+            recipes.order_by('-pk').values_list('author', 'pk')[:limit]
+        )
+    if not querysets:
+        return []
+    if connection.features.supports_slicing_ordering_in_compound:
+        rows = querysets[0].union(*querysets[1:], all=True)
+    else:
+        rows = chain.from_iterable(querysets)
+    feeds = defaultdict(list)
+    for author_id, recipe_id in rows:
+        feeds[author_id].append(recipe_id)
+    return list(islice(heapq.merge(
+        *(sorted(recipe_ids, reverse=True) for recipe_ids in feeds.values()),
+        reverse=True
+    ), limit))
+
+
+def read_feed_items(user_id, before, limit):
+    """Читает ленту пользователя из таблицы FeedItem"""
+    items = FeedItem.objects.filter(user=user_id)
+    if before is not None:
+        items = items.filter(recipe__lt=before)
+    return list(
+        items.order_by('-recipe_id').values_list('recipe', flat=True)[:limit]
+    )
+
+
+def get_feed_recipe_ids(user_id, before, limit):
+    """Возвращает id рецептов ленты подписок в порядке убывания"""
+    if is_heavy_follower(user_id):
+        return read_feed_items(user_id, before, limit)
+    return merge_author_feeds(
+        Follow.objects.filter(user=user_id).values_list('author', flat=True),
+        before,
+        limit
+    )
+
+
+def fill_feed(user_id, recipes):
+    """Добавляет в ленту пользователя последние рецепты из recipes"""
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, author_id=author_id, recipe_id=pk)
+            for pk, author_id in recipes.order_by('-pk').values_list(
+                'pk', 'author'
+            )[:settings.FEED_BACKFILL_SIZE]
+        ),
+        ignore_conflicts=True
+    )
+
+
+def rebuild_feed(user_id):
+    """Пересобирает ленту пользователя по всем его подпискам"""
+    FeedItem.objects.filter(user=user_id).delete()
+    fill_feed(user_id, Recipe.objects.filter(author__following__user=user_id))
+
+
+def follows_added(user_id, author_ids):
+    """Обновляет ленту после новых подписок: если пользователь
+    только что перешёл порог, лента собирается целиком"""
+    if not is_heavy_follower(user_id):
+        return
+    if not FeedItem.objects.filter(user=user_id).exists():
+        rebuild_feed(user_id)
+        return
+    fill_feed(user_id, Recipe.objects.filter(author__in=author_ids))
+
+
+def follows_removed(user_id, author_ids):
+    """Убирает из ленты рецепты авторов, от которых пользователь
+    отписался, или всю ленту, если подписок стало мало"""
+    items = FeedItem.objects.filter(user=user_id)
+    if is_heavy_follower(user_id):
+        items = items.filter(author__in=author_ids)
+    items.delete()
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора,
+    которые читают ленту из таблицы FeedItem"""
+    follows_count = Follow.objects.filter(
+        user=OuterRef('user')
+    ).order_by().values('user').annotate(total=Count('pk')).values('total')
+    followers = Follow.objects.filter(author=recipe.author_id).annotate(
+        follows_count=Subquery(follows_count)
+    ).filter(
+        follows_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('user', flat=True)
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, author_id=recipe.author_id,
+                     recipe=recipe)
+            for user_id in followers
+        ),
+        ignore_conflicts=True
+    )
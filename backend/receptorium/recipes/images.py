@@ -0,0 +1,171 @@
+from datetime import timedelta
+from hashlib import sha1
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageRendition, ImageTask, Recipe
+
+SAVE_OPTIONS = {
+    ImageRendition.WEBP: {'format': 'WEBP', 'method': 4},
+    ImageRendition.JPEG: {'format': 'JPEG', 'optimize': True,
+                          'progressive': True},
+}
+
+
+def delete_rendition_files(names):
+    """Удаляет файлы копий после коммита, чтобы откат
+    транзакции не оставил записи без файлов. Вне транзакции
+    файлы удаляются сразу"""
+    storage = ImageRendition._meta.get_field('image').storage
+    transaction.on_commit(
+        lambda: [storage.delete(name) for name in names]
+    )
+
+
+def enqueue_image_task(recipe):
+    """Ставит фото рецепта в очередь на обработку. Копии прежнего
+    фото удаляются сразу, до готовности новых отдаётся оригинал"""
+    renditions = recipe.renditions.all()
+    delete_rendition_files(list(renditions.values_list('image', flat=True)))
+    renditions.delete()
+    ImageTask.objects.filter(
+        recipe=recipe, status=ImageTask.PENDING
+    ).delete()
+    ImageTask.objects.create(recipe=recipe)
+
+
+def enqueue_missing_images(everything=False):
+    """Ставит в очередь фото рецептов без копий или, если задан
+    everything, фото всех рецептов. Рецепты, уже стоящие в очереди,
+    пропускаются. Возвращает число новых задач"""
+    recipes = Recipe.objects.exclude(image='').exclude(
+        image_tasks__status__in=[ImageTask.PENDING, ImageTask.PROCESSING]
+    )
+    if not everything:
+        recipes = recipes.filter(renditions__isnull=True)
+    tasks = ImageTask.objects.bulk_create(
+        (ImageTask(recipe_id=pk)
+         for pk in list(recipes.values_list('pk', flat=True))),
+        batch_size=1000
+    )
+    return len(tasks)
+
+
+def claim_image_tasks(limit):
+    """Забирает из очереди задачи, которые не обрабатывает
+    другой воркер. Задачи, зависшие в обработке дольше
+    IMAGE_TASK_CLAIM_TIMEOUT (например, после падения воркера),
+    забираются повторно или, если попытки кончились, помечаются
+    ошибочными"""
+    now = timezone.now()
+    stale = Q(
+        status=ImageTask.PROCESSING,
+        claimed_at__lt=now - timedelta(
+            seconds=settings.IMAGE_TASK_CLAIM_TIMEOUT
+        )
+    )
+    with transaction.atomic():
+        ImageTask.objects.filter(
+            stale, attempts__gte=settings.IMAGE_TASK_MAX_ATTEMPTS
+        ).update(
+            status=ImageTask.FAILED,
+            error='Обработка прервана: превышено время ожидания'
+        )
+        tasks = list(ImageTask.objects.select_for_update(
+            skip_locked=True
+        ).filter(Q(status=ImageTask.PENDING) | stale)[:limit])
+        ImageTask.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=ImageTask.PROCESSING,
+            attempts=F('attempts') + 1,
+            claimed_at=now
+        )
+    return [task.pk for task in tasks]
+
+
+def render_image(image, width, image_format):
+    """Возвращает копию фото заданной ширины в заданном формате"""
+    if image.width > width:
+        image = image.resize(
+            (width, round(image.height * width / image.width)),
+            Image.LANCZOS
+        )
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        **SAVE_OPTIONS[image_format]
+    )
+    return buffer.getvalue()
+
+
+def build_renditions(recipe):
+    """Создаёт копии фото рецепта для всех ширин и форматов,
+    имена файлов содержат хэш содержимого"""
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+    # Фото с телефонов хранят поворот в EXIF, а не в пикселях
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    widths = sorted({
+        min(width, image.width) for width in settings.RECIPE_IMAGE_WIDTHS
+    })
+    renditions = []
+    for width in widths:
+        for image_format, _ in ImageRendition.FORMATS:
+            content = render_image(image, width, image_format)
+            name = f'{sha1(content).hexdigest()[:16]}_{width}.{image_format}'
+            rendition = ImageRendition(
+                recipe=recipe, width=width, format=image_format
+            )
+            rendition.image.save(name, ContentFile(content), save=False)
+            renditions.append(rendition)
+    return renditions
+
+
+def save_renditions(task, renditions):
+    """Заменяет копии фото рецепта и отмечает задачу выполненной,
+    возвращает имена файлов, которые больше не нужны. Если фото
+    успели заменить, копии устаревшего фото не сохраняются"""
+    recipe = task.recipe
+    with transaction.atomic():
+        current_image = Recipe.objects.select_for_update().filter(
+            pk=recipe.pk
+        ).values_list('image', flat=True).first()
+        if current_image is None:
+            return [rendition.image.name for rendition in renditions]
+        task.status = ImageTask.DONE
+        task.error = ''
+        task.save(update_fields=['status', 'error'])
+        if current_image != recipe.image.name:
+            return [rendition.image.name for rendition in renditions]
+        old_renditions = list(
+            recipe.renditions.values_list('image', flat=True)
+        )
+        recipe.renditions.all().delete()
+        ImageRendition.objects.bulk_create(renditions)
+        recipe.save(update_fields=['updated_at'])
+    return old_renditions
+
+
+def process_image_task(task_id):
+    """Обрабатывает задачу из очереди и обновляет её статус"""
+    task = ImageTask.objects.select_related('recipe').get(pk=task_id)
+    try:
+        unused = save_renditions(task, build_renditions(task.recipe))
+    except Exception as error:
+        task.status = (
+            ImageTask.FAILED
+            if task.attempts >= settings.IMAGE_TASK_MAX_ATTEMPTS
+            else ImageTask.PENDING
+        )
+        task.error = str(error)
+        task.save(update_fields=['status', 'error'])
+        return False
+    delete_rendition_files(unused)
+    return True
@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.core.management import BaseCommand
+
+from api.cache import RECIPES_VERSION_KEY, get_version
+from api.indexes import RecipeIngredientSetIndex, build_bitsets
+
+
+class Command(BaseCommand):
+    help = "Benchmark matching user ingredients against a synthetic catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--have', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        # Популярные ингредиенты встречаются в рецептах чаще
+        weights = [1 / pk for pk in ingredient_ids]
+        pairs = [
+            (recipe_id, ingredient_id)
+            for recipe_id in range(1, options['recipes'] + 1)
+            for ingredient_id in set(generator.choices(
+                ingredient_ids, weights, k=options['per_recipe']
+            ))
+        ]
+        started = time.perf_counter()
+        index = RecipeIngredientSetIndex()
+        index.bitsets = dict(build_bitsets(pairs))
+        index.size = max(bits.bit_length() for bits in index.bitsets.values())
+        index.version = get_version(RECIPES_VERSION_KEY)
+        build_time = time.perf_counter() - started
+        timings = []
+        found = 0
+        for _ in range(options['repeat']):
+            have = generator.sample(ingredient_ids, options['have'])
+            started = time.perf_counter()
+            found += len(index.match(have, max_missing=3))
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'Рецептов: {options["recipes"]}, '
+            f'сборка индекса: {build_time * 1000:.0f} мс'
+        )
+        self.stdout.write(
+            f'Подбор: в среднем {sum(timings) / len(timings) * 1000:.1f} мс, '
+            f'максимум {max(timings) * 1000:.1f} мс, '
+            f'найдено рецептов в среднем: {found // options["repeat"]}'
+        )
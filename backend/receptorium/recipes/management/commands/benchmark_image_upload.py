@@ -0,0 +1,74 @@
+import base64
+import io
+import json
+import os
+import tracemalloc
+
+from django.core.management import BaseCommand
+from django.test import RequestFactory
+from PIL import Image
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from api.serializers import RecipeImageField
+
+
+def make_image(width, height):
+    """Функция для создания тестового фото из случайных пикселей"""
+    image = Image.frombytes(
+        'RGB', (width, height), os.urandom(width * height * 3)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def measure(django_request, parser):
+    """Функция для измерения пикового потребления памяти при разборе
+    запроса и проверке фото"""
+    request = Request(django_request, parsers=[parser()])
+    tracemalloc.start()
+    try:
+        image = RecipeImageField().run_validation(request.data['image'])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    image.close()
+    return peak
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory of base64 and multipart image uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=1600)
+        parser.add_argument('--height', type=int, default=1200)
+
+    def handle(self, *args, **options):
+        content = make_image(options['width'], options['height'])
+        factory = RequestFactory()
+        upload = io.BytesIO(content)
+        upload.name = 'image.jpg'
+        payload = 'data:image/jpeg;base64,{}'.format(
+            base64.b64encode(content).decode()
+        )
+        results = {
+            'base64': measure(
+                factory.post(
+                    '/api/recipes/',
+                    json.dumps({'image': payload}),
+                    content_type='application/json'
+                ),
+                JSONParser
+            ),
+            'multipart': measure(
+                factory.post(
+                    '/api/recipes/',
+                    {'image': upload}
+                ),
+                MultiPartParser
+            ),
+        }
+        self.stdout.write(f'Размер фото: {len(content)} байт')
+        for name, peak in results.items():
+            self.stdout.write(f'{name}: пик памяти {peak} байт')
@@ -0,0 +1,30 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes.similarity import build_similarity_index, write_similarity_index
+
+
+class Command(BaseCommand):
+    help = "Build the similar recipes index file using several processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--path', default=settings.SIMILAR_RECIPES_INDEX_PATH
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        neighbours = build_similarity_index(
+            options['k'], options['processes'], options['chunk_size']
+        )
+        write_similarity_index(options['path'], neighbours, options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс похожих рецептов собран: рецептов {len(neighbours)} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
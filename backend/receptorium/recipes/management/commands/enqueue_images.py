@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes.images import enqueue_missing_images
+
+
+class Command(BaseCommand):
+    help = "Queue recipe images that have no renditions yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Queue every recipe image, e.g. after changing widths'
+        )
+
+    def handle(self, *args, **options):
+        count = enqueue_missing_images(options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Поставлено в очередь фото: {count}'
+        ))
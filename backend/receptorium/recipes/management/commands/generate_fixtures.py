@@ -0,0 +1,319 @@
+import os
+import random
+import re
+from itertools import accumulate
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from api.cache import (FAVORITES_VERSION_KEY, INGREDIENTS_VERSION_KEY,
+                       RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY,
+                       SEARCH_VERSION_KEY, bump_version, delete_versions,
+                       get_recipe_version_key, get_user_version_key)
+from api.signals import receivers_muted
+from recipes.feed import rebuild_feed
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Tag)
+from recipes.search import write_search_documents
+from recipes.utils import rebuild_shopping_cart_totals, reconcile_counters
+from user.models import User
+from .load_data_csv import deduplicate, read_csv
+from .load_tags import clean_tags, read_csv as read_tags_csv, upsert_tags
+
+FIRST_NAME = 'Бенчмарк'
+EMAIL_DOMAIN = 'example.com'
+
+
+def get_username_regex(prefix):
+    return rf'^{re.escape(prefix)}_[0-9]+$'
+
+
+def get_cum_weights(size, exponent=1.0):
+    """Возвращает накопленные веса распределения Ципфа:
+    первые элементы выбираются намного чаще последних"""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def sample(generator, population, cum_weights, k):
+    """Выбирает до k разных элементов с учётом весов"""
+    return list(dict.fromkeys(
+        generator.choices(population, cum_weights=cum_weights, k=k)
+    ))
+
+
+def get_count(generator, mean, limit):
+    """Возвращает длину списка по экспоненциальному распределению:
+    у большинства пользователей списки короткие, у немногих длинные"""
+    if mean <= 0:
+        return 0
+    return min(limit, int(generator.expovariate(1 / mean)))
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic dataset for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=15)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Username prefix of generated users'
+        )
+        parser.add_argument(
+            '--clean',
+            action='store_true',
+            help='Delete users generated by a previous run with this prefix'
+        )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation before --clean'
+        )
+
+    def get_generated_users(self, prefix):
+        """Возвращает пользователей, созданных этой командой: имя вида
+        prefix_N, почта prefix_N@example.com и имя-метка. Настоящий
+        пользователь с похожим логином под выборку не попадёт"""
+        return User.objects.filter(
+            username__regex=get_username_regex(prefix),
+            email__endswith=f'@{EMAIL_DOMAIN}',
+            first_name=FIRST_NAME
+        )
+
+    def check_previous(self, prefix, options):
+        """Не даёт затронуть чужие данные: логины prefix_N должны быть
+        свободны, а данные прошлого запуска удаляются только
+        с ключом --clean и после подтверждения"""
+        if User.objects.filter(
+            username__regex=get_username_regex(prefix)
+        ).exclude(pk__in=self.users).exists():
+            raise CommandError(
+                f'Логины {prefix}_* заняты, укажите другой --prefix'
+            )
+        count = self.users.count()
+        if not count:
+            return
+        if not options['clean']:
+            raise CommandError(
+                f'Найдено пользователей прошлого запуска: {count}, '
+                'удалите их ключом --clean'
+            )
+        if options['interactive'] and input(
+            f'Будут удалены пользователи {prefix}_* ({count}) '
+            'с рецептами и списками. Введите yes для продолжения: '
+        ) != 'yes':
+            raise CommandError('Удаление отменено')
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        generator = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.users = self.get_generated_users(options['prefix'])
+        self.check_previous(options['prefix'], options)
+        with transaction.atomic():
+            self.delete_previous()
+            ingredients = self.create_ingredients(generator)
+            tags = self.create_tags()
+            users = self.create_users(options['prefix'], options['users'])
+            recipes = self.create_recipes(
+                generator, users, ingredients, tags, options
+            )
+            self.create_lists(generator, users, recipes, options)
+            self.refresh_aggregates()
+        for key in (INGREDIENTS_VERSION_KEY, REFERENCE_VERSION_KEY,
+                    RECIPES_VERSION_KEY, SEARCH_VERSION_KEY,
+                    FAVORITES_VERSION_KEY):
+            bump_version(key)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)} '
+            f'за {monotonic() - started:.1f} с'
+        ))
+
+    def delete_previous(self):
+        """Удаляет данные прошлого запуска с отключёнными обработчиками
+        сигналов: на каждую строку они пересобирали бы поиск, ленту
+        и счётчики, а здесь всё это пересчитывается в refresh_aggregates.
+        Версии удалённых рецептов и пользователей удаляются отдельно"""
+        keys = [
+            get_recipe_version_key(pk) for pk in Recipe.objects.filter(
+                author__in=self.users
+            ).values_list('pk', flat=True)
+        ] + [
+            get_user_version_key(pk)
+            for pk in self.users.values_list('pk', flat=True)
+        ]
+        with receivers_muted():
+            self.users.delete()
+        for start in range(0, len(keys), self.batch_size):
+            delete_versions(*keys[start:start + self.batch_size])
+
+    def create_ingredients(self, generator):
+        """Загружает ингредиенты из data/ingredients.csv
+        и перемешивает их, чтобы популярные были разными"""
+        path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        with open(path, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                deduplicate(read_csv(file), set()),
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', 'name')
+        )
+        generator.shuffle(ingredients)
+        return ingredients
+
+    def create_tags(self):
+        """Загружает теги из data/tags.csv"""
+        path = os.path.join(settings.BASE_DIR, 'data', 'tags.csv')
+        with open(path, encoding='utf-8') as file:
+            tags = clean_tags(read_tags_csv(file))
+        upsert_tags(tags)
+        return list(Tag.objects.filter(
+            slug__in=list(tags)
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_users(self, prefix, count):
+        password = make_password(prefix)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}_{number}',
+                    email=f'{prefix}_{number}@{EMAIL_DOMAIN}',
+                    first_name=FIRST_NAME,
+                    last_name=str(number),
+                    password=password
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        return list(self.users.order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, generator, users, ingredients, tags, options):
+        """Создаёт рецепты: у немногих авторов рецептов много,
+        ингредиенты и теги выбираются по распределению Ципфа"""
+        author_weights = get_cum_weights(len(users))
+        authors = generator.choices(
+            users, cum_weights=author_weights, k=options['recipes']
+        )
+        ingredient_weights = get_cum_weights(len(ingredients))
+        tag_weights = get_cum_weights(len(tags), 0.5)
+        compositions = []
+        recipes = []
+        for number, author_id in enumerate(authors):
+            composition = sample(
+                generator,
+                ingredients,
+                ingredient_weights,
+                generator.randint(3, options['ingredients_per_recipe'] * 2)
+            )
+            compositions.append((
+                composition,
+                sample(generator, tags, tag_weights, generator.randint(1, 3))
+            ))
+            main = composition[0][1]
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=f'{main.capitalize()} по-домашнему №{number}',
+                text='Смешайте {}.'.format(
+                    ', '.join(name for _, name in composition)
+                ),
+                cooking_time=generator.randint(5, 180),
+                image='recipes/benchmark.jpg'
+            ))
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        recipe_ids = list(Recipe.objects.filter(
+            author__in=self.users
+        ).order_by('pk').values_list('pk', flat=True))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=generator.randint(1, 500)
+                )
+                for recipe_id, (composition, _) in zip(
+                    recipe_ids, compositions
+                )
+                for ingredient_id, _ in composition
+            ),
+            batch_size=self.batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, (_, recipe_tags) in zip(
+                    recipe_ids, compositions
+                )
+                for tag_id in recipe_tags
+            ),
+            batch_size=self.batch_size
+        )
+        return recipe_ids
+
+    def create_lists(self, generator, users, recipes, options):
+        """Создаёт подписки, избранное и списки покупок:
+        популярные авторы и рецепты попадают в них чаще"""
+        author_weights = get_cum_weights(len(users))
+        recipe_weights = get_cum_weights(len(recipes))
+        follows, favorites, carts = [], [], []
+        for user_id in users:
+            for author_id in sample(
+                generator, users, author_weights,
+                get_count(generator, options['follows'], len(users))
+            ):
+                if author_id != user_id:
+                    follows.append(
+                        Follow(user_id=user_id, author_id=author_id)
+                    )
+            for recipe_id in sample(
+                generator, recipes, recipe_weights,
+                get_count(generator, options['favorites'], len(recipes))
+            ):
+                favorites.append(
+                    Favorite(user_id=user_id, recipe_id=recipe_id)
+                )
+            for recipe_id in sample(
+                generator, recipes, recipe_weights,
+                get_count(generator, options['cart'], len(recipes))
+            ):
+                carts.append(
+                    ShoppingList(user_id=user_id, recipe_id=recipe_id)
+                )
+        for model, objects in (
+            (Follow, follows), (Favorite, favorites), (ShoppingList, carts)
+        ):
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def refresh_aggregates(self):
+        """Пересчитывает то, что обычно обновляют сигналы:
+        bulk_create их не отправляет"""
+        reconcile_counters()
+        rebuild_shopping_cart_totals()
+        write_search_documents(
+            Recipe.objects.filter(author__in=self.users),
+            RecipeIngredient.objects.all(),
+            self.batch_size
+        )
+        heavy_followers = Follow.objects.values('user').annotate(
+            total=Count('pk')
+        ).filter(
+            total__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('user', flat=True)
+        for user_id in heavy_followers:
+            rebuild_feed(user_id)
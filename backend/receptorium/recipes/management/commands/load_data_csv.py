@@ -1,19 +1,112 @@
 import csv
+import json
+import os
+from itertools import islice
+from time import monotonic
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import INGREDIENTS_VERSION_KEY, bump_version
 from recipes.models import Ingredient
 
 
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+def deduplicate(chunk, seen):
+    """Возвращает ингредиенты из пачки, которых ещё не было
+    в загружаемом файле"""
+    ingredients = []
+    for name, measurement_unit in chunk:
+        key = (name.strip().lower(), measurement_unit.strip().lower())
+        if key not in seen:
+            seen.add(key)
+            ingredients.append(
+                Ingredient(name=key[0], measurement_unit=key[1])
+            )
+    return ingredients
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
 class Command(BaseCommand):
-    help = "Load ingridients from CSV"
+    help = "Load ingridients from CSV or JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Path to the file, data/ingredients.<format> by default'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS.keys(),
+            help='File format, guessed from the extension by default'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Roll back the transaction after loading'
+        )
+
+    def get_path_and_format(self, options):
+        path, file_format = options['path'], options['format']
+        if path is None:
+            file_format = file_format or 'csv'
+            path = os.path.join(
+                settings.BASE_DIR, 'data', f'ingredients.{file_format}'
+            )
+        elif file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.').lower()
+            if file_format not in READERS:
+                raise CommandError('Укажите формат файла через --format')
+        return path, file_format
 
     def handle(self, *args, **options):
-        with open('data/ingredients.csv') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0].lower(),
-                    measurement_unit=row[1].lower()
+        path, file_format = self.get_path_and_format(options)
+        batch_size = options['batch_size']
+        started = monotonic()
+        total = inserted = 0
+        seen = set()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            count_before = Ingredient.objects.count()
+            rows = READERS[file_format](file)
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                total += len(chunk)
+                Ingredient.objects.bulk_create(
+                    deduplicate(chunk, seen),
+                    batch_size=batch_size,
+                    ignore_conflicts=True
+                )
+            inserted = Ingredient.objects.count() - count_before
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(
+                    lambda: bump_version(INGREDIENTS_VERSION_KEY)
                 )
-        self.stdout.write(self.style.SUCCESS('База данных успешно заполнена'))
+        message = (
+            'Проверка завершена' if options['dry_run']
+            else 'База данных успешно заполнена'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{message}: добавлено {inserted}, пропущено {total - inserted} '
+            f'за {monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,142 @@
+import csv
+import json
+import os
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from api.cache import (RECIPES_VERSION_KEY, REFERENCE_VERSION_KEY,
+                       TAGS_VERSION_KEY)
+from api.signals import bump_on_commit
+from recipes.models import Tag
+from recipes.validators import get_color_hex
+
+FIELDS = ('name', 'color_name', 'slug')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(FIELDS, row))
+
+
+def read_json(file):
+    yield from json.load(file)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def clean_tags(rows):
+    """Проверяет строки файла валидаторами полей модели и возвращает
+    словарь slug -> значения полей с уже вычисленным HEX-кодом цвета"""
+    tags = {}
+    errors = []
+    for number, row in enumerate(rows, 1):
+        try:
+            values = {
+                field: Tag._meta.get_field(field).clean(
+                    str(row.get(field, '')).strip(), None
+                )
+                for field in FIELDS
+            }
+        except ValidationError as error:
+            errors.append(f'{number}: {"; ".join(error.messages)}')
+            continue
+        values['color'] = get_color_hex(values['color_name'])
+        tags.setdefault(values['slug'], values)
+    if errors:
+        raise CommandError('Ошибки в файле:\n' + '\n'.join(errors))
+    return tags
+
+
+def upsert_tags(tags):
+    """Создаёт новые теги и обновляет изменившиеся по slug одним
+    bulk_create и одним bulk_update, минуя Tag.save.
+    Возвращает число созданных и обновлённых тегов"""
+    existing = Tag.objects.in_bulk(list(tags), field_name='slug')
+    now = timezone.now()
+    created, updated = [], []
+    for slug, values in tags.items():
+        tag = existing.get(slug)
+        if tag is None:
+            created.append(Tag(**values))
+        elif any(getattr(tag, field) != value
+                 for field, value in values.items()):
+            for field, value in values.items():
+                setattr(tag, field, value)
+            tag.updated_at = now
+            updated.append(tag)
+    Tag.objects.bulk_create(created)
+    Tag.objects.bulk_update(updated, ('name', 'color_name', 'color',
+                                      'updated_at'))
+    if created or updated:
+        # bulk-операции не отправляют сигналы, версии меняем вручную
+        bump_on_commit(
+            TAGS_VERSION_KEY, REFERENCE_VERSION_KEY, RECIPES_VERSION_KEY
+        )
+    return len(created), len(updated)
+
+
+class Command(BaseCommand):
+    help = "Load tags from CSV or JSON, updating existing ones by slug"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Path to the file, data/tags.<format> by default'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS.keys(),
+            help='File format, guessed from the extension by default'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Roll back the transaction after loading'
+        )
+
+    def get_path_and_format(self, options):
+        path, file_format = options['path'], options['format']
+        if path is None:
+            file_format = file_format or 'csv'
+            path = os.path.join(
+                settings.BASE_DIR, 'data', f'tags.{file_format}'
+            )
+        elif file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.').lower()
+            if file_format not in READERS:
+                raise CommandError('Укажите формат файла через --format')
+        return path, file_format
+
+    def handle(self, *args, **options):
+        path, file_format = self.get_path_and_format(options)
+        started = monotonic()
+        with open(path, encoding='utf-8') as file:
+            tags = clean_tags(READERS[file_format](file))
+        try:
+            with transaction.atomic():
+                created, updated = upsert_tags(tags)
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+        except IntegrityError as error:
+            raise CommandError(
+                f'Название или цвет тега уже заняты другим тегом: {error}'
+            )
+        message = (
+            'Проверка завершена' if options['dry_run']
+            else 'Теги загружены'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{message}: добавлено {created}, обновлено {updated}, '
+            f'без изменений {len(tags) - created - updated} '
+            f'за {monotonic() - started:.2f} с'
+        ))
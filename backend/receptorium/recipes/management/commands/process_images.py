@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from recipes.images import claim_image_tasks, process_image_task
+
+
+def run_task(task_id):
+    try:
+        return process_image_task(task_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Process queued recipe images into resized renditions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                task_ids = claim_image_tasks(options['batch_size'])
+                if not task_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                results = list(pool.map(run_task, task_ids))
+                self.stdout.write(
+                    f'Обработано фото: {results.count(True)}, '
+                    f'с ошибкой: {results.count(False)}'
+                )
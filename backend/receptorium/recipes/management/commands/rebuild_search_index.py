@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from api.cache import RECIPES_VERSION_KEY, SEARCH_VERSION_KEY, bump_version
+from recipes.search import update_search_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild search documents of all recipes"
+
+    def handle(self, *args, **options):
+        update_search_documents()
+        bump_version(SEARCH_VERSION_KEY)
+        bump_version(RECIPES_VERSION_KEY)
+        self.stdout.write(
+            self.style.SUCCESS('Поисковые документы пересобраны')
+        )
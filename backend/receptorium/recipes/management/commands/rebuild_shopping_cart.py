@@ -0,0 +1,55 @@
+import math
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+from recipes.utils import (calculate_shopping_cart_totals,
+                           rebuild_shopping_cart_totals)
+
+
+class Command(BaseCommand):
+    help = "Rebuild shopping cart totals or check them for drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare stored totals with recipes, do not rebuild'
+        )
+
+    def find_drift(self):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in calculate_shopping_cart_totals()
+        }
+        drift = []
+        stored = ShoppingCartIngredient.objects.values_list(
+            'user', 'ingredient', 'amount'
+        )
+        for user_id, ingredient_id, amount in stored.iterator():
+            total = expected.pop((user_id, ingredient_id), None)
+            if total is None or not math.isclose(amount, total):
+                drift.append((user_id, ingredient_id, amount, total))
+        drift.extend(
+            (user_id, ingredient_id, None, total)
+            for (user_id, ingredient_id), total in expected.items()
+        )
+        return drift
+
+    def handle(self, *args, **options):
+        drift = self.find_drift()
+        for user_id, ingredient_id, amount, total in drift:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id} '
+                f'stored={amount} expected={total}'
+            )
+        if options['check']:
+            if drift:
+                raise CommandError(f'Найдено расхождений: {len(drift)}')
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+            return
+        rebuild_shopping_cart_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны, исправлено расхождений: {len(drift)}'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand, CommandError
+
+from api.cache import FAVORITES_VERSION_KEY, bump_version
+from recipes.utils import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Reconcile stored favorites, shopping cart and recipes counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drifted counters, do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(check=options['check'])
+        for counter, total in drift.items():
+            self.stdout.write(f'{counter}: {total}')
+        if options['check'] and any(drift.values()):
+            raise CommandError('Счётчики расходятся с данными')
+        if not options['check'] and any(drift.values()):
+            bump_version(FAVORITES_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
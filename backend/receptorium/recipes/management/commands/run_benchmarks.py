@@ -0,0 +1,189 @@
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe
+from user.models import User
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, rank):
+    """Возвращает перцентиль методом ближайшего ранга"""
+    values = sorted(values)
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+def get_content(response):
+    """Читает тело ответа, в том числе потокового: запросы к базе
+    при выгрузке списка покупок выполняются во время чтения"""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = "Benchmark hot API endpoints in-process and print JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Clear the cache before every request'
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Run only the named benchmarks'
+        )
+        parser.add_argument('--label', help='Free-form label for the run')
+        parser.add_argument('--output', help='Write JSON to this file')
+
+    def get_benchmarks(self, generator):
+        """Возвращает функции, которые строят адрес запроса для очередной
+        итерации: id рецептов и строки поиска меняются от итерации
+        к итерации, чтобы не мерить один и тот же ключ кэша"""
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not recipe_ids or not names:
+            raise CommandError(
+                'База пуста, сначала выполните generate_fixtures'
+            )
+        pages = math.ceil(len(recipe_ids) / 6)
+        recipe_ids = generator.sample(recipe_ids, min(len(recipe_ids), 500))
+        prefixes = [name[:3] for name in generator.sample(
+            names, min(len(names), 500)
+        )]
+        return {
+            'recipes_list': lambda: '/api/recipes/',
+            'recipes_list_deep_page': (
+                lambda: f'/api/recipes/?page={generator.randint(1, pages)}'
+            ),
+            'recipe_retrieve': (
+                lambda: f'/api/recipes/{generator.choice(recipe_ids)}/'
+            ),
+            'download_shopping_cart': (
+                lambda: '/api/recipes/download_shopping_cart/'
+            ),
+            'ingredients_search': (
+                lambda: f'/api/ingredients/?name={generator.choice(prefixes)}'
+            ),
+            'subscriptions': (
+                lambda: '/api/users/subscriptions/?recipes_limit=3'
+            ),
+        }
+
+    def get_user(self):
+        """Выбирает пользователя с самыми длинными списками, чтобы
+        подписки и список покупок не были пустыми"""
+        user = User.objects.annotate(
+            follows=Count('follower', distinct=True),
+            carts=Count('shopping_lists', distinct=True)
+        ).order_by('-carts', '-follows', 'pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей, сначала выполните generate_fixtures'
+            )
+        return user
+
+    def request(self, client, path, cold):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(path)
+            get_content(response)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{path}: статус {response.status_code}')
+        return elapsed, len(queries)
+
+    def run(self, client, get_path, options):
+        for _ in range(options['warmup']):
+            self.request(client, get_path(), options['cold'])
+        timings, query_counts = [], []
+        for _ in range(options['repeat']):
+            elapsed, query_count = self.request(
+                client, get_path(), options['cold']
+            )
+            timings.append(elapsed * 1000)
+            query_counts.append(query_count)
+        # Память меряется отдельным прогоном: tracemalloc
+        # заметно замедляет код и исказил бы задержки
+        tracemalloc.start()
+        try:
+            self.request(client, get_path(), options['cold'])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'latency_ms': dict(
+                [(f'p{rank}', round(percentile(timings, rank), 2))
+                 for rank in PERCENTILES]
+                + [('mean', round(sum(timings) / len(timings), 2)),
+                   ('max', round(max(timings), 2))]
+            ),
+            'queries': {
+                'min': min(query_counts),
+                'max': max(query_counts),
+            },
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть больше нуля')
+        generator = random.Random(options['seed'])
+        benchmarks = self.get_benchmarks(generator)
+        only = options['only'] or list(benchmarks)
+        unknown = set(only) - set(benchmarks)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные бенчмарки: {", ".join(sorted(unknown))}'
+            )
+        user = self.get_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        report = {
+            'label': options['label'],
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'options': {
+                name: options[name]
+                for name in ('repeat', 'warmup', 'seed', 'cold')
+            },
+            'results': {
+                name: self.run(client, benchmarks[name], options)
+                for name in only
+            },
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,75 @@
+# Generated by Django 3.2 on 2026-10-18 18:19
+
+from collections import defaultdict
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import Value
+
+SEARCH_INDEX = 'recipes_recipe_search_vector_idx'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_INDEX} ON recipes_recipe '
+            'USING GIN (search_vector);'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX};')
+
+
+def fill_search_documents(apps, schema_editor):
+    # Копия recipes.search.write_search_documents на момент миграции:
+    # дальнейшие изменения модуля поиска не должны её менять
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    alias = schema_editor.connection.alias
+    full_text = schema_editor.connection.vendor == 'postgresql'
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.using(alias).order_by(
+        'ingredient__name'
+    ).values_list('recipe', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    for recipe_id, name, text in list(
+        Recipe.objects.using(alias).values_list('pk', 'name', 'text')
+    ):
+        ingredients = ' '.join(ingredient_names[recipe_id])
+        fields = {'search_document': '\n'.join([name, ingredients, text])}
+        if full_text:
+            fields['search_vector'] = (
+                SearchVector(Value(name), weight='A', config='russian')
+                + SearchVector(
+                    Value(ingredients), weight='B', config='russian'
+                )
+                + SearchVector(Value(text), weight='C', config='russian')
+            )
+        Recipe.objects.using(alias).filter(pk=recipe_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_tags_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(
+            fill_search_documents, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+def enqueue_existing_images(apps, schema_editor):
+    # Фото, загруженные до очереди обработки, ещё без копий
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ImageTask = apps.get_model('recipes', 'ImageTask')
+    alias = schema_editor.connection.alias
+    recipes = Recipe.objects.using(alias).exclude(image='').filter(
+        renditions__isnull=True
+    ).exclude(
+        image_tasks__status__in=['pending', 'processing']
+    ).values_list('pk', flat=True)
+    ImageTask.objects.using(alias).bulk_create(
+        (ImageTask(recipe_id=pk) for pk in list(recipes)),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagetask',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взята в обработку'),
+        ),
+        migrations.RunPython(
+            enqueue_existing_images, migrations.RunPython.noop
+        ),
+    ]
@@ -1,11 +1,10 @@
-import webcolors
-
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.forms import ValidationError
 
 from user.models import User
-from .validators import validate_hex_color
+from .validators import get_color_hex, validate_hex_color
 
 
 class Ingredient(models.Model):
@@ -18,6 +17,10 @@ class Ingredient(models.Model):
         max_length=10,
         verbose_name='Единицы измерения'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -59,6 +62,10 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Slug'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -69,7 +76,7 @@ class Tag(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        self.color = webcolors.name_to_hex(self.color_name)
+        self.color = get_color_hex(self.color_name)
         super().save(*args, **kwargs)
 
 
@@ -106,6 +113,32 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Фото'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+    shopping_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+    search_document = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Поисковый документ'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -116,6 +149,16 @@ class Recipe(models.Model):
                 fields=['name', 'text', ], name='uniqe_recipe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -240,3 +283,168 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель с итоговым количеством каждого ингредиента
+    в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Ингредиент'
+    )
+    amount = models.FloatField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', ],
+                name='uniqe_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class ImageRendition(models.Model):
+    """Модель уменьшенных копий фото рецепта"""
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    FORMATS = (
+        (WEBP, 'WebP'),
+        (JPEG, 'JPEG'),
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='renditions',
+        verbose_name='Рецепт'
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    format = models.CharField(
+        max_length=4,
+        choices=FORMATS,
+        verbose_name='Формат'
+    )
+    image = models.ImageField(
+        upload_to='recipes/renditions/',
+        verbose_name='Фото'
+    )
+
+    class Meta:
+        verbose_name = 'Копия фото рецепта'
+        verbose_name_plural = 'Копии фото рецептов'
+        ordering = ['width']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'width', 'format', ],
+                name='uniqe_image_rendition'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.width} {self.format}'
+
+
+class ImageTask(models.Model):
+    """Модель очереди задач на обработку фото рецептов"""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_tasks',
+        verbose_name='Рецепт'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в обработку'
+    )
+
+    class Meta:
+        verbose_name = 'Задача обработки фото'
+        verbose_name_plural = 'Задачи обработки фото'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'created_at'],
+                name='image_task_status_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.status}'
+
+
+class FeedItem(models.Model):
+    """Модель ленты подписок, которая заранее заполняется для
+    пользователей с большим числом подписок"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', ], name='uniqe_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='feed_item_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Value
+
+from .models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_full_text_supported(using=DEFAULT_DB_ALIAS):
+    """Проверяет, умеет ли база полнотекстовый поиск"""
+    return connections[using].vendor == 'postgresql'
+
+
+def get_search_vector(name, text, ingredients):
+    """Возвращает взвешенный поисковый вектор рецепта:
+    название важнее ингредиентов, ингредиенты важнее текста"""
+    return (
+        SearchVector(Value(name), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(ingredients), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Value(text), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def write_search_documents(recipes, recipe_ingredients, batch_size=1000):
+    """Записывает поисковые документы рецептов из queryset recipes,
+    названия ингредиентов берутся из queryset recipe_ingredients.
+    Документы обновляются пачками по batch_size рецептов"""
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in recipe_ingredients.filter(
+        recipe__in=recipes
+    ).order_by('ingredient__name').values_list('recipe', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    fields = ['search_document']
+    full_text = is_full_text_supported(recipes.db)
+    if full_text:
+        fields.append('search_vector')
+    documents = []
+    for recipe_id, name, text in list(
+        recipes.values_list('pk', 'name', 'text')
+    ):
+        ingredients = ' '.join(ingredient_names[recipe_id])
+        document = recipes.model(
+            pk=recipe_id,
+            search_document='\n'.join([name, ingredients, text])
+        )
+        if full_text:
+            document.search_vector = get_search_vector(
+                name, text, ingredients
+            )
+        documents.append(document)
+    recipes.model.objects.using(recipes.db).bulk_update(
+        documents, fields, batch_size=batch_size
+    )
+
+
+def update_search_documents(recipe_ids=None):
+    """Пересобирает поисковые документы указанных рецептов
+    или всех рецептов, если id не переданы"""
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    write_search_documents(recipes, RecipeIngredient.objects.all())
+
+
+def full_text_search(queryset, query):
+    """Фильтрует рецепты по поисковому вектору
+    и сортирует их по релевантности"""
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=search_query).annotate(
+        search_rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-search_rank', '-pk')
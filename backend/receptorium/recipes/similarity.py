@@ -0,0 +1,167 @@
+import os
+import random
+import struct
+from array import array
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.db import connections
+
+from .models import Recipe, RecipeIngredient
+
+MAGIC = b'SIMR'
+HEADER = struct.Struct('<4sIII')
+FORMAT_VERSION = 1
+NUM_PERMUTATIONS = 64
+BAND_ROWS = 4
+MAX_BUCKET_SIZE = 500
+PRIME = (1 << 61) - 1
+
+_features = {}
+_buckets = {}
+_memberships = {}
+
+
+def get_recipe_features():
+    """Возвращает множества признаков рецептов: чётные числа
+    для ингредиентов, нечётные для тегов"""
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe', 'ingredient'
+    ).iterator():
+        features[recipe_id].add(ingredient_id * 2)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+        'recipe', 'tag'
+    ).iterator():
+        features[recipe_id].add(tag_id * 2 + 1)
+    return features
+
+
+def get_permutations(seed=0):
+    generator = random.Random(seed)
+    return [
+        (generator.randrange(1, PRIME), generator.randrange(PRIME))
+        for _ in range(NUM_PERMUTATIONS)
+    ]
+
+
+def minhash_chunk(items):
+    """Считает MinHash-сигнатуры для части рецептов"""
+    permutations = get_permutations()
+    return [
+        (recipe_id, tuple(
+            min((a * feature + b) % PRIME for feature in features)
+            for a, b in permutations
+        ))
+        for recipe_id, features in items
+    ]
+
+
+def get_buckets(signatures):
+    """Раскладывает рецепты по корзинам LSH: рецепты с одинаковой
+    полосой сигнатуры становятся кандидатами в похожие"""
+    buckets = defaultdict(list)
+    for recipe_id, signature in signatures:
+        for start in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+            buckets[(start, signature[start:start + BAND_ROWS])].append(
+                recipe_id
+            )
+    return {
+        band: recipe_ids for band, recipe_ids in buckets.items()
+        if 1 < len(recipe_ids) <= MAX_BUCKET_SIZE
+    }
+
+
+def get_memberships(buckets):
+    """Возвращает для каждого рецепта список его корзин"""
+    memberships = defaultdict(list)
+    for band, recipe_ids in buckets.items():
+        for recipe_id in recipe_ids:
+            memberships[recipe_id].append(band)
+    return memberships
+
+
+def init_worker(features, buckets, memberships):
+    global _features, _buckets, _memberships
+    _features, _buckets, _memberships = features, buckets, memberships
+
+
+def neighbours_chunk(args):
+    """Находит k самых похожих рецептов по точному коэффициенту
+    Жаккара среди кандидатов из общих корзин"""
+    recipe_ids, k = args
+    result = []
+    for recipe_id in recipe_ids:
+        features = _features[recipe_id]
+        candidates = set()
+        for band in _memberships.get(recipe_id, ()):
+            candidates.update(_buckets[band])
+        scores = []
+        for other_id in candidates:
+            if other_id == recipe_id:
+                continue
+            other = _features[other_id]
+            scores.append((
+                len(features & other) / len(features | other), other_id
+            ))
+        scores.sort(key=lambda score: (-score[0], -score[1]))
+        result.append((recipe_id, scores[:k]))
+    return result
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_similarity_index(k, processes, chunk_size=1000):
+    """Строит список k похожих рецептов для каждого рецепта,
+    распределяя вычисления между процессами"""
+    features = get_recipe_features()
+    items = sorted(features.items())
+    connections.close_all()
+    with Pool(processes) as pool:
+        signatures = [
+            signature
+            for chunk in pool.map(minhash_chunk, chunked(items, chunk_size))
+            for signature in chunk
+        ]
+    buckets = get_buckets(signatures)
+    recipe_ids = [recipe_id for recipe_id, _ in items]
+    with Pool(
+        processes,
+        initializer=init_worker,
+        initargs=(features, buckets, get_memberships(buckets))
+    ) as pool:
+        return [
+            neighbours
+            for chunk in pool.map(neighbours_chunk, [
+                (chunk, k) for chunk in chunked(recipe_ids, chunk_size)
+            ])
+            for neighbours in chunk
+        ]
+
+
+def write_similarity_index(path, neighbours, k):
+    """Записывает индекс в файл: заголовок, отсортированные id рецептов,
+    затем по k id похожих рецептов и по k оценок на каждый рецепт.
+    Файл подменяется атомарно, чтобы воркеры не прочитали его
+    недописанным"""
+    neighbours = sorted(neighbours)
+    recipe_ids = array('Q', (recipe_id for recipe_id, _ in neighbours))
+    similar_ids = array('Q')
+    scores = array('f')
+    for _, similar in neighbours:
+        padding = [(0.0, 0)] * (k - len(similar))
+        for score, similar_id in similar + padding:
+            similar_ids.append(similar_id)
+            scores.append(score)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as index_file:
+        index_file.write(
+            HEADER.pack(MAGIC, FORMAT_VERSION, k, len(recipe_ids))
+        )
+        recipe_ids.tofile(index_file)
+        similar_ids.tofile(index_file)
+        scores.tofile(index_file)
+    os.replace(temporary_path, path)
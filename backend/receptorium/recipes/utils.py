@@ -0,0 +1,134 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from user.models import User
+from .models import (Favorite, Recipe, RecipeIngredient,
+                     ShoppingCartIngredient, ShoppingList)
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def increment_counter(model, pk, field, delta=1):
+    """Атомарно меняет значение счётчика в базе данных,
+    не опуская его ниже нуля"""
+    increment_counters(model, [pk], field, delta)
+
+
+def increment_counters(model, pks, field, delta=1):
+    """Меняет счётчик сразу у нескольких объектов одним запросом"""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет дату изменения рецептов, у которых строки
+    ингредиентов изменили без сохранения самого рецепта"""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+def count_related(related_model, related_field):
+    """Возвращает подзапрос с числом связанных объектов"""
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile_counters(check=False):
+    """Сверяет сохранённые счётчики с данными и исправляет
+    расхождения, возвращает число расхождений по каждому счётчику"""
+    drift = {}
+    with transaction.atomic():
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_related(related_model, related_field)
+            drifted = model.objects.annotate(actual=actual).exclude(
+                **{field: F('actual')}
+            )
+            drift[f'{model._meta.model_name}.{field}'] = drifted.count()
+            if not check:
+                model.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{field: actual})
+    return drift
+
+
+def calculate_shopping_cart_totals(**filters):
+    """Считает суммы ингредиентов по спискам покупок
+    напрямую из рецептов"""
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_lists__isnull=False, **filters
+    ).values(
+        'recipe__shopping_lists__user', 'ingredient'
+    ).annotate(total=Sum('amount')).values_list(
+        'recipe__shopping_lists__user', 'ingredient', 'total'
+    )
+
+
+def lock_users(users):
+    """Блокирует строки пользователей до конца транзакции в порядке
+    id, чтобы изменения их списков не пересекались и не ждали
+    друг друга по кругу"""
+    list(User.objects.select_for_update().filter(
+        pk__in=users
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def refresh_shopping_cart_totals(users, ingredients):
+    """Пересчитывает итоговые суммы в списках покупок только
+    для переданных пользователей и ингредиентов. Пользователи
+    блокируются, иначе два параллельных пересчёта вставили бы
+    одни и те же строки"""
+    with transaction.atomic():
+        lock_users(users)
+        ShoppingCartIngredient.objects.filter(
+            user__in=users, ingredient__in=ingredients
+        ).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            )
+            for user_id, ingredient_id, total in
+            calculate_shopping_cart_totals(
+                recipe__shopping_lists__user__in=users,
+                ingredient__in=ingredients
+            )
+        )
+
+
+def refresh_recipes_cart_totals(recipe_ids, ingredients=None):
+    """Пересчитывает суммы у всех, кто добавил рецепты в список
+    покупок, по переданным ингредиентам или по всем ингредиентам
+    рецептов"""
+    if ingredients is None:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids
+        ).values('ingredient')
+    refresh_shopping_cart_totals(
+        ShoppingList.objects.filter(recipe__in=recipe_ids).values('user'),
+        ingredients
+    )
+
+
+def rebuild_shopping_cart_totals():
+    """Полностью пересобирает таблицу итоговых сумм"""
+    with transaction.atomic():
+        ShoppingCartIngredient.objects.all().delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            )
+            for user_id, ingredient_id, total in
+            calculate_shopping_cart_totals()
+        )
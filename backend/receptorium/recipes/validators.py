@@ -1,7 +1,17 @@
+from functools import lru_cache
+
+import webcolors
 from django.core.exceptions import ValidationError
 from webcolors import CSS3_NAMES_TO_HEX
 
 
+@lru_cache(maxsize=None)
+def get_color_hex(color_name):
+    """Возвращает HEX-код цвета по названию, результат кэшируется:
+    названий всего полторы сотни"""
+    return webcolors.name_to_hex(color_name)
+
+
 def validate_hex_color(value: str) -> bool:
     """Проверяет сущестует ли такой цвет в
     HEX библиотеке"""
@@ -16,6 +16,9 @@ class User(AbstractUser):
     last_name = models.CharField(
         max_length=150, blank=False, verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число рецептов'
+    )
 
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
     USERNAME_FIELD = 'email'